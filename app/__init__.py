@@ -1,4 +1,5 @@
-from flask import Flask
+from flask import Flask, flash, redirect, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_login import LoginManager
 from authlib.integrations.flask_client import OAuth
 import os
@@ -9,15 +10,19 @@ from .routes.client import client_bp
 from .routes.prompt import prompt_bp
 from .routes.template import template_bp
 from .routes.main import main_bp
+from .routes.metrics import metrics_bp
 from .models.user import load_user  # Added import
+from .utils.uploads import SpoolingRequest, max_upload_bytes
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 def create_app():
     app = Flask(__name__, template_folder='../templates', static_folder='../static')
+    # Spool uploads to temporary files and hash them while they are received
+    app.request_class = SpoolingRequest
     app.config['UPLOAD_FOLDER'] = '/tmp'
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    app.config['MAX_CONTENT_LENGTH'] = max_upload_bytes()
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key')
     app.config['GOOGLE_CLIENT_ID'] = os.environ.get('GOOGLE_CLIENT_ID')
     app.config['GOOGLE_CLIENT_SECRET'] = os.environ.get('GOOGLE_CLIENT_SECRET')
@@ -47,5 +52,14 @@ def create_app():
     app.register_blueprint(prompt_bp)
     app.register_blueprint(template_bp)
     app.register_blueprint(main_bp)
+    app.register_blueprint(metrics_bp)
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def upload_too_large(e):
+        if e.description and e.description.startswith('Upload quota'):
+            flash(e.description, 'danger')
+        else:
+            flash(f"Upload too large: the limit is {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB per request.", 'danger')
+        return redirect(url_for('main.index'))
 
     return app
\ No newline at end of file
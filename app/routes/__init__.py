@@ -3,4 +3,5 @@ from .auth import auth_bp
 from .client import client_bp
 from .prompt import prompt_bp
 from .template import template_bp
-from .main import main_bp
\ No newline at end of file
+from .main import main_bp
+from .metrics import metrics_bp
\ No newline at end of file
@@ -1,20 +1,68 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
 from flask_login import login_required, current_user
 from ..utils.database import get_db_connection, get_user_clients, get_templates_for_client, get_conversion_prompts_for_client
-from ..utils.document import process_docx, process_text_input
-from ..utils.conversion import convert_content
-from ..utils.docx_builder import create_reformatted_docx
-from docx import Document
-from docx.shared import Pt
-import json
+from ..utils.document import process_docx, process_text_input, parse_docx
+from ..utils.conversion import convert_content_chunked, convert_content_batch
+from ..utils.output_cache import render_cached, output_cache, key_owner
+from ..utils.conversion_results import (
+    save_conversion_result, list_conversion_results, get_conversion_result, get_renderable_templates,
+    render_result, text_hash
+)
+from ..utils.html_preview import render_preview
+from ..utils.ooxml_reader import PARSER_VERSION
+from ..utils.prompt_compaction import compact_template_prompt, compaction_savings
+from ..utils.section_matcher import get_section_matcher
+from ..utils.template_artifacts import get_template_artifacts, prompt_hash
+from ..utils.uploads import check_upload_quota, charge_uploads, upload_hash
+from ..utils.package_normalizer import record_source_package
+from ..utils.limits import Deadline, DocumentTooComplex
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+import os
+import zipfile
 from io import BytesIO
 import logging
-import re
 
 logger = logging.getLogger(__name__)
 
 main_bp = Blueprint('main', __name__)
 
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Over-quota uploads are refused before their body is read; accepted uploads are charged by their handlers
+main_bp.before_request(check_upload_quota)
+
+def _docx_response(key, output_file, filename='reformatted_document.docx'):
+    # The render key is a content hash, so it doubles as a strong ETag; Content-Location points at the re-download URL
+    response = Response(
+        output_file,
+        mimetype=DOCX_MIMETYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Content-Location': url_for('main.download', key=key),
+            'Cache-Control': 'private, max-age=0, must-revalidate',
+        }
+    )
+    response.set_etag(key)
+    return response
+
+def _store_result(**kwargs):
+    # Persisting is best effort; a failure here should not cost the user their converted document
+    try:
+        return save_conversion_result(current_user.id, **kwargs)
+    except Exception as e:
+        logger.error(f"Failed to store conversion result: {str(e)}")
+        return None
+
+def _compact_prompt_for(artifacts, template_prompt):
+    """
+    Return (compact_prompt, section_styles) for the submitted template prompt, reusing the precomputed
+    split when the prompt is the template's stored one.
+    """
+    if prompt_hash(template_prompt) == artifacts["prompt_hash"]:
+        return artifacts["compact_prompt"], artifacts["section_styles"]
+    return compact_template_prompt(template_prompt)
+
 @main_bp.route('/', methods=['GET', 'POST'])
 @login_required
 def index():
@@ -50,7 +98,7 @@ def index():
         if action == 'select_client':
             return redirect(url_for('main.index', client_id=selected_client))
 
-        elif action == 'convert':
+        elif action in ('convert', 'preview'):
             if not selected_template:
                 flash('Please select a template', 'danger')
                 return redirect(url_for('main.index', client_id=selected_client))
@@ -59,130 +107,46 @@ def index():
                 return redirect(url_for('main.index', client_id=selected_client))
 
             try:
-                # Get template file and prompt for styling and structuring
-                conn = get_db_connection()
-                cur = conn.cursor()
-                cur.execute(
-                    "SELECT template_file, template_prompt_id, p.content AS template_prompt_content "
-                    "FROM templates t "
-                    "LEFT JOIN prompts p ON t.template_prompt_id = p.id "
-                    "WHERE t.id = %s AND t.user_id = %s",
-                    (selected_template, current_user.id)
-                )
-                template_data = cur.fetchone()
-                template_file = template_data[0]
-                template_prompt_id = template_data[1]
-                template_prompt_content = template_data[2]
-                cur.close()
-                conn.close()
-
-                if not template_file:
+                # Precomputed template analysis (styles, sections, skeleton); the template file itself is not read
+                artifacts = get_template_artifacts(selected_template, current_user.id)
+
+                if not artifacts:
                     flash('Template file not found. Please ensure the selected template has an associated file.', 'danger')
                     return redirect(url_for('main.index', client_id=selected_client))
-                if not template_prompt_content:
+                if not artifacts["template_prompt_content"]:
                     flash('Template prompt content not found. Please ensure the selected template has an associated prompt.', 'danger')
                     return redirect(url_for('main.index', client_id=selected_client))
 
-                logger.info(f"Using template file for template ID {selected_template} (length: {len(template_file)} bytes)")
+                logger.info(f"Using precomputed artifacts for template ID {selected_template} ({artifacts['template_hash'][:12]})")
 
-                # Parse expected sections from the template prompt
-                expected_sections = []
-                section_pattern = r"\*\*Section:\s*([^\*]+)\*\*\s*- \*\*Purpose\*\*:\s*This section represents\s*([^\s]+)\s*content"
-                for match in re.finditer(section_pattern, template_prompt_content):
-                    section_name = match.group(1).strip()
-                    section_key = match.group(2).strip()
-                    expected_sections.append((section_name.lower(), section_key))
+                # Only section semantics go to the LLM; style lines are routed straight to the builder
+                compact_prompt, section_styles = _compact_prompt_for(artifacts, template_prompt)
+                savings = compaction_savings(template_prompt, compact_prompt)
+                logger.info(
+                    f"Template {selected_template} prompt compaction: {savings['tokens_before']} -> "
+                    f"{savings['tokens_after']} tokens ({savings['percent_saved']}% saved)"
+                )
+
+                # Expected sections were parsed from the template prompt at precompute time
+                expected_sections = artifacts["expected_sections"]
 
                 # Process source content
                 source_file = request.files.get('source_file')
                 if source_file and source_file.filename.endswith('.docx'):
-                    # For .docx files, extract content directly
-                    doc = Document(source_file)
-                    sections = []
-                    current_section = None
-                    raw_content = []
-
-                    # Extract all paragraphs and tables
-                    for element in doc.element.body:
-                        if element.tag.endswith('p'):  # Paragraph
-                            para = doc.paragraphs[len(raw_content)]
-                            text = para.text.strip()
-                            if text:
-                                raw_content.append({"type": "paragraph", "text": text, "runs": para.runs})
-                        elif element.tag.endswith('tbl'):  # Table
-                            table = doc.tables[len([e for e in raw_content if e["type"] == "table"])]
-                            table_content = []
-                            for row in table.rows:
-                                row_content = [cell.text.strip() for cell in row.cells]
-                                table_content.append(row_content)
-                            raw_content.append({"type": "table", "content": table_content})
-
-                    # Map content to expected sections using template prompt
-                    structured_content = {"sections": {}}
-                    used_content_indices = set()
-
-                    for section_name, section_key in expected_sections:
-                        best_match_idx = -1
-                        best_match_score = 0
-                        for idx, item in enumerate(raw_content):
-                            if idx in used_content_indices:
-                                continue
-                            if item["type"] == "paragraph":
-                                text = item["text"].lower()
-                                # Simple scoring based on header similarity
-                                if section_name in text:
-                                    score = 1.0  # Exact match
-                                else:
-                                    # Approximate match based on keywords
-                                    keywords = section_name.split()
-                                    score = sum(1 for keyword in keywords if keyword in text) / len(keywords)
-                                if score > best_match_score:
-                                    best_match_score = score
-                                    best_match_idx = idx
-
-                        if best_match_idx >= 0:
-                            # Found a matching paragraph, start collecting content until the next section
-                            content = []
-                            idx = best_match_idx
-                            while idx < len(raw_content):
-                                item = raw_content[idx]
-                                if idx in used_content_indices:
-                                    idx += 1
-                                    continue
-                                if item["type"] == "paragraph":
-                                    text = item["text"]
-                                    # Check if this paragraph matches another section header
-                                    is_new_section = False
-                                    for other_section_name, _ in expected_sections:
-                                        if other_section_name != section_name and other_section_name in text.lower():
-                                            is_new_section = True
-                                            break
-                                    if is_new_section:
-                                        break
-                                    content.append(text)
-                                    used_content_indices.add(idx)
-                                elif item["type"] == "table":
-                                    # Tables are handled separately
-                                    break
-                                idx += 1
-                            structured_content["sections"][section_key] = content
-                            used_content_indices.add(best_match_idx)
-
-                    # Handle tables separately
-                    tables = []
-                    for idx, item in enumerate(raw_content):
-                        if idx in used_content_indices:
-                            continue
-                        if item["type"] == "table":
-                            tables.append(item["content"])
-                            used_content_indices.add(idx)
-                    if tables:
-                        structured_content["sections"]["tables"] = tables
-
-                    # Fill missing sections with empty lists
-                    for _, section_key in expected_sections:
-                        if section_key not in structured_content["sections"]:
-                            structured_content["sections"][section_key] = []
+                    charge_uploads(source_file)
+                    # For .docx files, parse paragraphs and tables (cached by upload hash)
+                    record_source_package(source_file.stream, source_file.filename)
+                    # Parsing and section matching share one parse budget
+                    deadline = Deadline.for_parse()
+                    parsed = parse_docx(source_file.stream, content_hash=upload_hash(source_file), deadline=deadline)
+
+                    # Map content to expected sections using the template's precompiled section matcher
+                    structured_content = get_section_matcher(tuple(expected_sections)).match(parsed.blocks, deadline)
+                    result_id = _store_result(
+                        client_id=selected_client, structured_content=structured_content,
+                        source_name=source_file.filename, method='parsed', source_hash=upload_hash(source_file),
+                        parser_version=PARSER_VERSION, template_id=selected_template, artifacts=artifacts
+                    )
 
                 else:
                     # For non-.docx sources, use LLM to interpret content
@@ -191,17 +155,31 @@ def index():
                         flash('Please upload a .docx file or provide text input', 'danger')
                         return redirect(url_for('main.index', client_id=selected_client))
                     content = process_text_input(source_text)
-                    structured_content = convert_content(content, template_prompt, conversion_prompt)
+                    structured_content = convert_content_chunked(
+                        content, compact_prompt, conversion_prompt,
+                        template_key=selected_template, expected_sections=len(expected_sections)
+                    )
+                    result_id = _store_result(
+                        client_id=selected_client, structured_content=structured_content,
+                        source_name='Pasted text', method='llm', source_hash=text_hash(source_text),
+                        template_id=selected_template, artifacts=artifacts, conversion_prompt=conversion_prompt
+                    )
 
-                # Apply styles with python-docx
-                output_file = create_reformatted_docx(structured_content, template_file)
+                # Previews show the stored result as HTML; the .docx is only built when downloaded from there
+                if action == 'preview' and result_id is not None:
+                    return redirect(url_for('main.preview_result', result_id=result_id, template_id=selected_template))
+
+                # Apply styles with python-docx; identical renders are served from the output cache
+                key, output_file = render_cached(current_user.id, structured_content, artifacts, section_styles)
 
                 # Return the file for immediate download
-                return Response(
-                    output_file,
-                    mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                    headers={'Content-Disposition': 'attachment; filename=reformatted_document.docx'}
-                )
+                return _docx_response(key, output_file)
+            except RequestEntityTooLarge as e:
+                flash(e.description, 'danger')
+                return redirect(url_for('main.index', client_id=selected_client))
+            except DocumentTooComplex as e:
+                flash(f"This document is too large or complex to convert: {str(e)}. Please split it or simplify it and try again.", 'danger')
+                return redirect(url_for('main.index', client_id=selected_client))
             except TypeError as e:
                 flash(f"Conversion failed due to invalid input types: {str(e)}. Please ensure the template and conversion prompts are correctly formatted.", 'danger')
                 return redirect(url_for('main.index', client_id=selected_client))
@@ -221,6 +199,176 @@ def index():
         conversion_prompt_id=conversion_prompt_id
     )
 
+@main_bp.route('/convert_batch', methods=['POST'])
+@login_required
+def convert_batch():
+    selected_client = request.form.get('client', '')
+    selected_template = request.form.get('template', '')
+    template_prompt = request.form.get('template_prompt', '')
+    conversion_prompt = request.form.get('conversion_prompt', '')
+    source_files = [f for f in request.files.getlist('source_files') if f and f.filename.endswith('.docx')]
+
+    if not selected_template:
+        flash('Please select a template', 'danger')
+        return redirect(url_for('main.index', client_id=selected_client))
+    if not template_prompt:
+        flash('Template prompt is required', 'danger')
+        return redirect(url_for('main.index', client_id=selected_client))
+    if not source_files:
+        flash('Please upload one or more .docx files for bulk conversion', 'danger')
+        return redirect(url_for('main.index', client_id=selected_client))
+    charge_uploads(*source_files)
+
+    try:
+        artifacts = get_template_artifacts(selected_template, current_user.id)
+        if not artifacts:
+            flash('Template file not found. Please ensure the selected template has an associated file.', 'danger')
+            return redirect(url_for('main.index', client_id=selected_client))
+
+        compact_prompt, section_styles = _compact_prompt_for(artifacts, template_prompt)
+        contents = [process_docx(source_file.stream, content_hash=upload_hash(source_file)) for source_file in source_files]
+        results = convert_content_batch(
+            contents, compact_prompt, conversion_prompt,
+            template_key=selected_template, expected_sections=len(artifacts["expected_sections"])
+        )
+        logger.info(f"Bulk converted {len(results)} documents with template ID {selected_template}")
+        for source_file, structured_content in zip(source_files, results):
+            _store_result(
+                client_id=selected_client, structured_content=structured_content,
+                source_name=source_file.filename, method='llm_batch', source_hash=upload_hash(source_file),
+                template_id=selected_template, artifacts=artifacts, conversion_prompt=conversion_prompt
+            )
+
+        archive = BytesIO()
+        used_names = set()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for source_file, structured_content in zip(source_files, results):
+                base_name = os.path.splitext(secure_filename(source_file.filename))[0] or 'document'
+                name = f"{base_name}_reformatted.docx"
+                counter = 2
+                while name in used_names:
+                    name = f"{base_name}_reformatted_{counter}.docx"
+                    counter += 1
+                used_names.add(name)
+                zf.writestr(name, render_cached(current_user.id, structured_content, artifacts, section_styles)[1])
+
+        return Response(
+            archive.getvalue(),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=reformatted_documents.zip'}
+        )
+    except DocumentTooComplex as e:
+        flash(f"A document is too large or complex to convert: {str(e)}. Please split it or simplify it and try again.", 'danger')
+        return redirect(url_for('main.index', client_id=selected_client))
+    except Exception as e:
+        flash(f"Bulk conversion failed: {str(e)}. Please check the template and conversion prompts and try again.", 'danger')
+        return redirect(url_for('main.index', client_id=selected_client))
+
+@main_bp.route('/download/<key>')
+@login_required
+def download(key):
+    """
+    Re-download an earlier output by its render key, without re-running the conversion.
+
+    Supports If-None-Match, so a browser holding the current file gets a 304.
+    """
+    # Keys of other users' outputs are treated as unknown
+    output_file = output_cache.get(key) if key_owner(key) == str(current_user.id) else None
+    if output_file is None:
+        flash('That document is no longer available. Please convert it again.', 'danger')
+        return redirect(url_for('main.index'))
+    return _docx_response(key, output_file).make_conditional(request)
+
+@main_bp.route('/results')
+@login_required
+def results():
+    return render_template(
+        'results.html',
+        results=list_conversion_results(current_user.id),
+        templates=get_renderable_templates(current_user.id)
+    )
+
+@main_bp.route('/results/<int:result_id>/preview')
+@login_required
+def preview_result(result_id):
+    """
+    Show a stored result as HTML styled by a template (by default the one it was converted for), without building a .docx.
+    """
+    result = get_conversion_result(result_id, current_user.id)
+    if result is None:
+        flash('Conversion result not found', 'danger')
+        return redirect(url_for('main.results'))
+    structured, converted_template_id = result
+    templates = get_renderable_templates(current_user.id)
+    template_id = request.args.get('template_id', type=int) or converted_template_id
+    if template_id is None and templates:
+        template_id = templates[0]['id']
+
+    artifacts = get_template_artifacts(template_id, current_user.id) if template_id else None
+    if not artifacts:
+        flash('Please select a template with a file to preview with', 'danger')
+        return redirect(url_for('main.results'))
+
+    return render_template(
+        'preview.html',
+        result_id=result_id,
+        templates=templates,
+        template_id=template_id,
+        preview=render_preview(structured, artifacts["style_profile"], artifacts["section_styles"])
+    )
+
+@main_bp.route('/results/<int:result_id>/render', methods=['POST'])
+@login_required
+def render_stored_result(result_id):
+    """
+    Render a stored conversion result against the selected templates: one .docx, or a .zip for several.
+    """
+    template_names = {template['id']: template['template_name'] for template in get_renderable_templates(current_user.id)}
+    template_ids = []
+    for value in request.form.getlist('template_ids'):
+        if value.isdigit() and int(value) in template_names and int(value) not in template_ids:
+            template_ids.append(int(value))
+    if not template_ids:
+        flash('Please select at least one template with a file', 'danger')
+        return redirect(url_for('main.results'))
+
+    try:
+        rendered = render_result(result_id, template_ids, current_user.id)
+        if rendered is None:
+            flash('Conversion result not found', 'danger')
+            return redirect(url_for('main.results'))
+        if not rendered:
+            flash('None of the selected templates has a file to render with', 'danger')
+            return redirect(url_for('main.results'))
+
+        if len(rendered) == 1:
+            name = secure_filename(template_names[rendered[0]['template_id']]) or 'template'
+            return _docx_response(rendered[0]['key'], rendered[0]['output_file'], filename=f"result_{result_id}_{name}.docx")
+
+        archive = BytesIO()
+        used_names = set()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for item in rendered:
+                base_name = secure_filename(template_names[item['template_id']]) or 'template'
+                name = f"{base_name}.docx"
+                counter = 2
+                while name in used_names:
+                    name = f"{base_name}_{counter}.docx"
+                    counter += 1
+                used_names.add(name)
+                zf.writestr(name, item['output_file'])
+        return Response(
+            archive.getvalue(),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=result_{result_id}_templates.zip'}
+        )
+    except DocumentTooComplex as e:
+        flash(f"This document is too large or complex to render: {str(e)}.", 'danger')
+        return redirect(url_for('main.results'))
+    except Exception as e:
+        flash(f"Rendering failed: {str(e)}. Please check the selected templates and try again.", 'danger')
+        return redirect(url_for('main.results'))
+
 @main_bp.route('/load_client', methods=['POST'])
 def load_client():
     client_id = request.form.get('client_id', '')
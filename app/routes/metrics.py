@@ -0,0 +1,17 @@
+from flask import Blueprint, request, abort, jsonify
+from flask_login import current_user
+from ..utils.metrics import snapshot
+import hmac
+import os
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    # Logged-in users, or scrapers presenting METRICS_TOKEN as a bearer token
+    token = os.environ.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(token) and hmac.compare_digest(authorization, f"Bearer {token}")
+    if not token_ok and not current_user.is_authenticated:
+        abort(401)
+    return jsonify(snapshot())
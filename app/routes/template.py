@@ -2,12 +2,21 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from ..utils.database import get_db_connection, get_user_clients, get_templates_for_client
 from ..utils.document import process_docx
+from ..utils.model_routing import choose_model, escalation_chain, record_outcome
+from ..utils.serialization import estimate_tokens
+from ..utils.package_normalizer import normalize_template_file
+from ..utils.template_styles import get_style_profile
+from ..utils.template_artifacts import refresh_template_artifacts
+from ..utils.uploads import check_upload_quota, charge_uploads
+from ..utils.limits import DocumentTooComplex, check_package
 from docx import Document
 from docx.shared import Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from werkzeug.exceptions import RequestEntityTooLarge
 import requests
 import json
 import os
+import zipfile
 from tempfile import NamedTemporaryFile
 from io import BytesIO
 from requests.adapters import HTTPAdapter
@@ -19,6 +28,31 @@ logger = logging.getLogger(__name__)
 
 template_bp = Blueprint('template', __name__)
 
+# Over-quota template uploads are refused before their body is read, as for source uploads
+template_bp.before_request(check_upload_quota)
+
+def _read_template_upload(template_file, template_name):
+    """
+    Read an uploaded template: charge it to the user's quota, check its package against the document budgets
+    before anything is inflated, and normalize it.
+
+    Returns:
+        tuple: (bytes to store, package report or None), or (None, None) if no .docx was uploaded.
+
+    Raises:
+        RequestEntityTooLarge: If the upload would exceed the user's quota.
+        DocumentTooComplex: If the package has too many parts or expands beyond the size budget.
+    """
+    if not template_file or not template_file.filename.endswith('.docx'):
+        return None, None
+    charge_uploads(template_file)
+    file_data = template_file.read()
+    if not file_data:
+        return None, None
+    with zipfile.ZipFile(BytesIO(file_data)) as zf:
+        check_package(zf)
+    return normalize_template_file(file_data, template_name)
+
 @template_bp.route('/create_template', methods=['GET', 'POST'])
 @login_required
 def create_template():
@@ -84,22 +118,30 @@ def create_template():
                     cur.close()
                     conn.close()
                     return redirect(url_for('template.create_template', client_id=client_id))
-                file_data = template_file.read() if template_file and template_file.filename.endswith('.docx') else None
+                file_data, package_report = _read_template_upload(template_file, template_name)
                 if file_data:
                     logger.info(f"Storing template file for '{template_name}' (size: {len(file_data)} bytes)")
                 else:
                     logger.info(f"No template file provided for '{template_name}'")
                 cur.execute(
-                    "INSERT INTO templates (user_id, client_id, template_name, template_prompt_id, template_file) "
-                    "VALUES (%s, %s, %s, %s, %s) RETURNING id",
-                    (current_user.id, client_id_value, template_name, template_prompt_id or None, file_data)
+                    "INSERT INTO templates (user_id, client_id, template_name, template_prompt_id, template_file, package_report) "
+                    "VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+                    (current_user.id, client_id_value, template_name, template_prompt_id or None, file_data,
+                     json.dumps(package_report) if package_report else None)
                 )
                 template_id = cur.fetchone()[0]
+                refresh_template_artifacts(cur, template_id)
                 conn.commit()
                 flash(f'Template "{template_name}" created successfully', 'success')
                 cur.close()
                 conn.close()
                 return redirect(url_for('template.create_template', client_id=client_id))
+            except RequestEntityTooLarge as e:
+                flash(e.description, 'danger')
+                return redirect(url_for('template.create_template', client_id=client_id))
+            except DocumentTooComplex as e:
+                flash(f'This template is too large or complex to use: {str(e)}', 'danger')
+                return redirect(url_for('template.create_template', client_id=client_id))
             except Exception as e:
                 flash(f'Failed to create template: {str(e)}', 'danger')
                 return redirect(url_for('template.create_template', client_id=client_id))
@@ -133,13 +175,14 @@ def create_template():
                     conn.close()
                     return redirect(url_for('template.create_template', client_id=client_id))
                 template_id = template[0]
-                file_data = template_file.read() if template_file and template_file.filename.endswith('.docx') else None
+                file_data, package_report = _read_template_upload(template_file, template_name)
                 if file_data:
                     logger.info(f"Updating template file for '{template_name}' (size: {len(file_data)} bytes)")
                     cur.execute(
-                        "UPDATE templates SET template_name = %s, template_prompt_id = %s, template_file = %s "
+                        "UPDATE templates SET template_name = %s, template_prompt_id = %s, template_file = %s, package_report = %s "
                         "WHERE id = %s",
-                        (template_name, template_prompt_id or None, file_data, template_id)
+                        (template_name, template_prompt_id or None, file_data,
+                         json.dumps(package_report) if package_report else None, template_id)
                     )
                 else:
                     logger.info(f"No new template file provided for '{template_name}' during update")
@@ -148,11 +191,18 @@ def create_template():
                         "WHERE id = %s",
                         (template_name, template_prompt_id or None, template_id)
                     )
+                refresh_template_artifacts(cur, template_id)
                 conn.commit()
                 flash(f'Template "{template_name}" updated successfully', 'success')
                 cur.close()
                 conn.close()
                 return redirect(url_for('template.create_template', client_id=client_id))
+            except RequestEntityTooLarge as e:
+                flash(e.description, 'danger')
+                return redirect(url_for('template.create_template', client_id=client_id))
+            except DocumentTooComplex as e:
+                flash(f'This template is too large or complex to use: {str(e)}', 'danger')
+                return redirect(url_for('template.create_template', client_id=client_id))
             except Exception as e:
                 flash(f'Failed to update template: {str(e)}', 'danger')
                 return redirect(url_for('template.create_template', client_id=client_id))
@@ -225,25 +275,38 @@ def create_template_file(template_id):
             "```\n"
         )
         
-        payload = {
-            "model": "gpt-4o",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": "Generate the .docx structure based on the template prompt."}
-            ],
-            "max_tokens": 1500,
-            "temperature": 0.7
-        }
-        
         session = requests.Session()
         retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
         session.mount('https://', HTTPAdapter(max_retries=retries))
-        response = session.post(os.environ.get('API_URL', 'https://api.openai.com/v1/chat/completions'), headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        if "choices" not in data or not data["choices"]:
-            raise ValueError("No response from AI")
-        doc_structure = json.loads(data["choices"][0]["message"]["content"])
+
+        # Start with the smallest suitable model and escalate when the JSON is invalid
+        expected_sections = prompt_content.count("**Section:")
+        models = escalation_chain(choose_model(estimate_tokens(system_prompt), expected_sections, f"template_file:{template_id}"))
+        for attempt, model in enumerate(models, 1):
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": "Generate the .docx structure based on the template prompt."}
+                ],
+                "max_tokens": 1500,
+                "temperature": 0.7
+            }
+            response = session.post(os.environ.get('API_URL', 'https://api.openai.com/v1/chat/completions'), headers=headers, json=payload, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            if "choices" not in data or not data["choices"]:
+                raise ValueError("No response from AI")
+            try:
+                doc_structure = json.loads(data["choices"][0]["message"]["content"])
+            except json.JSONDecodeError as e:
+                record_outcome(f"template_file:{template_id}", model, False)
+                if attempt == len(models):
+                    raise
+                logger.warning(f"Model {model} returned invalid JSON ({str(e)}), escalating to {models[attempt]}")
+                continue
+            record_outcome(f"template_file:{template_id}", model, True)
+            break
 
         # Generate .docx file using python-docx
         for section in doc_structure.get("sections", []):
@@ -307,6 +370,7 @@ def create_template_file(template_id):
             (file_data, template_id, current_user.id)
         )
         logger.info(f"Updated template file for template ID {template_id} (size: {len(file_data)} bytes)")
+        refresh_template_artifacts(cur, template_id)
         conn.commit()
         flash('Template file generated successfully from prompt', 'success')
         cur.close()
@@ -340,40 +404,8 @@ def create_prompt_from_file(template_id):
 
         template_file, template_name, client_id = template
         logger.info(f"Retrieved template file for template ID {template_id} (size: {len(template_file)} bytes)")
-        with NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-            temp_file.write(template_file)
-            temp_file_path = temp_file.name
-
-        doc = Document(temp_file_path)
-        os.unlink(temp_file_path)
-        sections = []
-        current_section = None
-        for para in doc.paragraphs:
-            text = para.text.strip()
-            if not text:
-                continue
-            is_header = (
-                para.runs and (
-                    para.runs[0].bold or
-                    (para.runs[0].font.size is not None and para.runs[0].font.size > Pt(12))
-                ) or
-                text.isupper()
-            )
-            if is_header:
-                current_section = text
-                style = {
-                    "font": para.runs[0].font.name or "Arial" if para.runs else "Arial",
-                    "size_pt": para.runs[0].font.size.pt if para.runs and para.runs[0].font.size else 12,
-                    "bold": para.runs[0].bold if para.runs and para.runs[0].bold is not None else False,
-                    "color_rgb": [para.runs[0].font.color.rgb.red, para.runs[0].font.color.rgb.green, para.runs[0].font.color.rgb.blue] if para.runs and para.runs[0].font.color.rgb else [0, 0, 0],
-                    "alignment": {WD_ALIGN_PARAGRAPH.LEFT: "left", WD_ALIGN_PARAGRAPH.CENTER: "center", WD_ALIGN_PARAGRAPH.RIGHT: "right", WD_ALIGN_PARAGRAPH.JUSTIFY: "justify"}.get(para.paragraph_format.alignment, "left"),
-                    "spacing_before_pt": para.paragraph_format.space_before.pt if para.paragraph_format.space_before else 6,
-                    "spacing_after_pt": para.paragraph_format.space_after.pt if para.paragraph_format.space_after else 6,
-                    "is_horizontal_list": "•" in text and text.count('\n') <= 1
-                }
-                sections.append({"header": current_section, "style": style, "content": []})
-            elif current_section:
-                sections[-1]["content"].append(text)
+        # Section headers and their styles come from the shared style-profile cache
+        sections = get_style_profile(bytes(template_file))["sections"]
 
         prompt_content = (
             "This is a template prompt for generating a document with the following structure and styling:\n\n"
@@ -409,6 +441,7 @@ def create_prompt_from_file(template_id):
             "UPDATE templates SET template_prompt_id = %s WHERE id = %s",
             (new_prompt_id, template_id)
         )
+        refresh_template_artifacts(cur, template_id)
         conn.commit()
         flash(f'Template prompt "{prompt_name}" generated successfully from file', 'success')
         cur.close()
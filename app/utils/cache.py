@@ -0,0 +1,179 @@
+import os
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache of byte strings, bounded by entry count and total size.
+
+    Other values can be stored by passing sizeof, which returns the size in bytes counted for a value.
+    """
+
+    def __init__(self, maxsize=128, max_bytes=64 * 1024 * 1024, sizeof=len):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.sizeof(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= self.sizeof(previous)
+            self._data[key] = value
+            self.size_bytes += self.sizeof(value)
+            while len(self._data) > self.maxsize or self.size_bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size_bytes -= self.sizeof(evicted)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    Byte-string cache in a local directory, one file per key. Keys must be filename-safe (e.g. hex digests).
+
+    Bounded by total size: once entries exceed max_bytes, the least recently used ones (by mtime, which
+    reads refresh) are deleted until the cache is back under 90% of the bound. The size is re-measured from
+    the directory at each eviction, so several processes can share one directory.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size_bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _entries(self):
+        # In-progress writes are dot-files and not counted
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries if entry.is_file() and not entry.name.startswith('.')]
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Disk cache read failed for {key}: {str(e)}")
+            return None
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        # Write to a temporary file and rename so readers never see a partial entry
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+        except OSError as e:
+            logger.warning(f"Disk cache write failed for {key}: {str(e)}")
+            return
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+        with self._lock:
+            self.size_bytes += len(value)
+            if self.size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        try:
+            entries = []
+            for entry in self._entries():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"Disk cache eviction failed: {str(e)}")
+            return
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Disk cache eviction failed for {path}: {str(e)}")
+                continue
+            total -= size
+            evicted += 1
+        self.size_bytes = total
+        logger.info(f"Disk cache {self.directory}: evicted {evicted} entries, {total} bytes remain")
+
+
+class TieredCache:
+    """
+    An in-memory LRU in front of an optional DiskCache. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    @classmethod
+    def from_env(cls, prefix, maxsize=128, max_bytes=64 * 1024 * 1024, disk_max_bytes=1024 * 1024 * 1024):
+        """
+        Build a cache configured by <prefix>_SIZE, <prefix>_MAX_MB, and <prefix>_DIR with <prefix>_DIR_MAX_MB
+        (disk tier, optional).
+        """
+        memory = LRUCache(
+            maxsize=int(os.environ.get(f'{prefix}_SIZE', maxsize)),
+            max_bytes=int(float(os.environ.get(f'{prefix}_MAX_MB', max_bytes / (1024 * 1024))) * 1024 * 1024),
+        )
+        directory = os.environ.get(f'{prefix}_DIR')
+        disk = None
+        if directory:
+            disk = DiskCache(
+                directory,
+                max_bytes=int(float(os.environ.get(f'{prefix}_DIR_MAX_MB', disk_max_bytes / (1024 * 1024))) * 1024 * 1024),
+            )
+        return cls(memory, disk)
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
@@ -2,151 +2,420 @@ import requests
 import json
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from .serialization import serialize_blocks, estimate_tokens
+from .ir import Paragraph, Table
+from .model_routing import choose_model, escalation_chain, record_outcome
+from .fanout import fanout_controller, record_llm_call
 
 logger = logging.getLogger(__name__)
 
-def convert_content(content, template_prompt, conversion_prompt):
+# Packing limits for convert_content_batch
+BATCH_SMALL_DOCUMENT_TOKENS = int(os.environ.get('BATCH_SMALL_DOCUMENT_TOKENS', 1500))
+BATCH_MAX_INPUT_TOKENS = int(os.environ.get('BATCH_MAX_INPUT_TOKENS', 6000))
+BATCH_MAX_DOCUMENTS = int(os.environ.get('BATCH_MAX_DOCUMENTS', 8))
+BATCH_DOCUMENT_DELIMITER = "### DOCUMENT {doc_id} ###"
+
+def _normalize_content(content):
+    """
+    Normalise the content argument of convert_content into a string.
+    """
+    if isinstance(content, dict):
+        # Backward compatibility for older process_docx versions
+        if "content" in content and isinstance(content["content"], list):
+            blocks = []
+            for item in content["content"]:
+                if isinstance(item, dict) and "type" in item:
+                    if item["type"] == "table":
+                        blocks.append(Table.coerce(item["data"]))
+                    elif item["type"] == "paragraph":
+                        blocks.append(Paragraph(item["text"]))
+                else:
+                    blocks.append(Paragraph(str(item)))
+            return serialize_blocks(blocks)
+        return str(content)
+    if not isinstance(content, str):
+        raise TypeError(f"Expected 'content' to be a string or dict, got {type(content)}")
+    return content
+
+def _build_system_prompt(template_prompt, conversion_prompt):
+    """
+    Build the system prompt shared by single and batched conversions.
+    """
+    if not isinstance(template_prompt, str):
+        raise TypeError(f"Expected 'template_prompt' to be a string, got {type(template_prompt)}")
+    if not isinstance(conversion_prompt, str):
+        raise TypeError(f"Expected 'conversion_prompt' to be a string, got {type(conversion_prompt)}")
+
+    system_prompt = (
+        "You are an AI assistant tasked with converting raw content into a structured JSON format "
+        "based on a template prompt, followed by applying additional conversion instructions to modify the content.\n\n"
+        "**Step 1: Structure the Content Using the Template Prompt**\n"
+        "Use the following template prompt to define the structure, sections, and semantics of the output:\n\n"
+        "**Template Prompt**:\n" + template_prompt + "\n\n"
+        "Based on the template prompt, structure the raw content into sections such as headers, contact info, "
+        "professional summary, core competencies, professional experience, education, etc. Ensure the content "
+        "is organized according to the template's specified layout and semantics.\n\n"
+        "**Step 2: Apply Conversion Instructions (if provided)**\n"
+        "The conversion instructions are for modifying the content's tone, brevity, or wording, NOT for applying "
+        "document styling (e.g., fonts, colors, sizes, spacing). Styling will be handled separately after this step.\n"
+    )
+    if conversion_prompt:
+        system_prompt += (
+            "After structuring the content, apply the following conversion instructions to modify the tone, brevity, "
+            "or other attributes of the content as specified:\n\n"
+            "**Conversion Instructions**:\n" + conversion_prompt + "\n\n"
+            "For example, if the conversion instructions specify a more professional tone or concise wording, "
+            "rewrite the structured content accordingly while preserving the structure defined by the template prompt.\n\n"
+        )
+        logger.info(f"Conversion prompt provided: {conversion_prompt}")
+    else:
+        system_prompt += "No additional conversion instructions provided. Proceed with the structured content as is.\n\n"
+        logger.info("No conversion prompt provided.")
+
+    system_prompt += (
+        "**Output Format**:\n"
+        "Return a JSON object with the following structure:\n"
+        "```json\n"
+        "{\n"
+        "  \"sections\": {\n"
+        "    \"name\": \"Full Name\",\n"
+        "    \"contact\": \"Contact Info\",\n"
+        "    \"professional_summary\": \"Summary text\",\n"
+        "    \"core_competencies\": [\"Skill 1\", \"Skill 2\", ...],\n"
+        "    \"professional_experience\": [\n"
+        "      \"Company Name - Title, Location, Dates\",\n"
+        "      \"- Responsibility 1\",\n"
+        "      \"- Responsibility 2\"\n"
+        "    ],\n"
+        "    \"education\": [\"Degree, School, Location, Dates\"],\n"
+        "    ...\n"
+        "  }\n"
+        "}\n"
+        "```\n"
+        "Ensure the content is structured according to the template prompt and then modified by the conversion instructions "
+        "(e.g., tone, brevity), but do NOT apply document styling (e.g., fonts, colors, sizes, spacing)."
+    )
+    return system_prompt
+
+def _post_chat_completion(payload):
+    """
+    Send a chat completion request with retries and return the message content.
+
+    Raises:
+        requests.exceptions.HTTPError: If the API returns an error status.
+        ValueError: If the response has no choices.
+    """
+    headers = {
+        "Authorization": f"Bearer {os.environ.get('API_KEY')}",
+        "Content-Type": "application/json"
+    }
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount('https://', HTTPAdapter(max_retries=retries))
+
+    started = time.monotonic()
+    try:
+        response = session.post(
+            os.environ.get('AI_API_URL', 'https://api.openai.com/v1/chat/completions'),
+            headers=headers,
+            json=payload,
+            timeout=30
+        )
+    except requests.exceptions.RetryError as e:
+        # Retries exhausted; the urllib3 reason names the status that kept failing
+        record_llm_call(time.monotonic() - started, rate_limited=1 if "429" in str(e) else 0)
+        raise
+
+    # 429s retried by urllib3 never reach us as responses, but are kept in the retry history
+    retries = getattr(response.raw, 'retries', None)
+    rate_limited = sum(1 for attempt in (retries.history if retries else ()) if attempt.status == 429)
+    rate_limited += 1 if response.status_code == 429 else 0
+    if not response.ok:
+        record_llm_call(time.monotonic() - started, rate_limited=rate_limited)
+    response.raise_for_status()
+
+    data = response.json()
+    record_llm_call(
+        time.monotonic() - started,
+        tokens=(data.get("usage") or {}).get("total_tokens", 0),
+        rate_limited=rate_limited
+    )
+    if "choices" not in data or not data["choices"]:
+        raise ValueError("No response from AI")
+    return data["choices"][0]["message"]["content"]
+
+def convert_content(content, template_prompt, conversion_prompt, template_key=None, expected_sections=0):
     """
     Convert raw content into a structured format using LLM based on the template prompt.
-    
+
+    The model is chosen by size-based routing (see model_routing.choose_model) and escalated to the
+    next larger configured model when a response is not valid JSON.
+
     Args:
         content (str or dict): The raw content extracted from the source document.
         template_prompt (str): The prompt defining the structure and semantics.
         conversion_prompt (str): Additional instructions for modifying content (e.g., tone, brevity).
-    
+        template_key (optional): Identifies the template for per-template routing history.
+        expected_sections (int): Number of sections the template expects.
+
     Returns:
         dict: Structured content in JSON format.
-    
+
     Raises:
         Exception: If the API call fails or inputs are invalid.
     """
     try:
-        # Handle content input
-        if isinstance(content, dict):
-            # Backward compatibility for older process_docx versions
-            if "content" in content and isinstance(content["content"], list):
-                content_lines = []
-                for item in content["content"]:
-                    if isinstance(item, dict) and "type" in item:
-                        if item["type"] == "table":
-                            content_lines.append(f"Table: {item['data']}")
-                        elif item["type"] == "paragraph":
-                            content_lines.append(item["text"])
-                    else:
-                        content_lines.append(str(item))
-                content = "\n\n".join(content_lines)
-            else:
-                content = str(content)
-        elif not isinstance(content, str):
-            raise TypeError(f"Expected 'content' to be a string or dict, got {type(content)}")
-
-        # Validate other inputs
-        if not isinstance(template_prompt, str):
-            raise TypeError(f"Expected 'template_prompt' to be a string, got {type(template_prompt)}")
-        if not isinstance(conversion_prompt, str):
-            raise TypeError(f"Expected 'conversion_prompt' to be a string, got {type(conversion_prompt)}")
-
-        # Prepare the system prompt for the LLM
-        system_prompt = (
-            "You are an AI assistant tasked with converting raw content into a structured JSON format "
-            "based on a template prompt, followed by applying additional conversion instructions to modify the content.\n\n"
-            "**Step 1: Structure the Content Using the Template Prompt**\n"
-            "Use the following template prompt to define the structure, sections, and semantics of the output:\n\n"
-            "**Template Prompt**:\n" + template_prompt + "\n\n"
-            "Based on the template prompt, structure the raw content into sections such as headers, contact info, "
-            "professional summary, core competencies, professional experience, education, etc. Ensure the content "
-            "is organized according to the template's specified layout and semantics.\n\n"
-            "**Step 2: Apply Conversion Instructions (if provided)**\n"
-            "The conversion instructions are for modifying the content's tone, brevity, or wording, NOT for applying "
-            "document styling (e.g., fonts, colors, sizes, spacing). Styling will be handled separately after this step.\n"
-        )
-        if conversion_prompt:
-            system_prompt += (
-                "After structuring the content, apply the following conversion instructions to modify the tone, brevity, "
-                "or other attributes of the content as specified:\n\n"
-                "**Conversion Instructions**:\n" + conversion_prompt + "\n\n"
-                "For example, if the conversion instructions specify a more professional tone or concise wording, "
-                "rewrite the structured content accordingly while preserving the structure defined by the template prompt.\n\n"
-            )
-            logger.info(f"Conversion prompt provided: {conversion_prompt}")
-        else:
-            system_prompt += "No additional conversion instructions provided. Proceed with the structured content as is.\n\n"
-            logger.info("No conversion prompt provided.")
-
-        system_prompt += (
-            "**Output Format**:\n"
-            "Return a JSON object with the following structure:\n"
-            "```json\n"
-            "{\n"
-            "  \"sections\": {\n"
-            "    \"name\": \"Full Name\",\n"
-            "    \"contact\": \"Contact Info\",\n"
-            "    \"professional_summary\": \"Summary text\",\n"
-            "    \"core_competencies\": [\"Skill 1\", \"Skill 2\", ...],\n"
-            "    \"professional_experience\": [\n"
-            "      \"Company Name - Title, Location, Dates\",\n"
-            "      \"- Responsibility 1\",\n"
-            "      \"- Responsibility 2\"\n"
-            "    ],\n"
-            "    \"education\": [\"Degree, School, Location, Dates\"],\n"
-            "    ...\n"
-            "  }\n"
-            "}\n"
-            "```\n"
-            "Ensure the content is structured according to the template prompt and then modified by the conversion instructions "
-            "(e.g., tone, brevity), but do NOT apply document styling (e.g., fonts, colors, sizes, spacing)."
-        )
+        content = _normalize_content(content)
+        system_prompt = _build_system_prompt(template_prompt, conversion_prompt)
 
         # Prepare the user prompt with the raw content
         user_prompt = "Here is the raw content to convert:\n\n" + content
 
-        # Prepare the API payload
-        payload = {
-            "model": "gpt-4o",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "max_tokens": 3000,
-            "temperature": 0.7
-        }
-
-        # Set up the request with retries
-        headers = {
-            "Authorization": f"Bearer {os.environ.get('API_KEY')}",
-            "Content-Type": "application/json"
-        }
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-
-        # Make the API call
-        response = session.post(
-            os.environ.get('AI_API_URL', 'https://api.openai.com/v1/chat/completions'),
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
-        response.raise_for_status()
-
-        # Parse the response
-        data = response.json()
-        if "choices" not in data or not data["choices"]:
-            raise ValueError("No response from AI")
+        estimated_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        models = escalation_chain(choose_model(estimated_tokens, expected_sections, template_key))
+        for attempt, model in enumerate(models, 1):
+            # Prepare the API payload
+            payload = {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                "max_tokens": 3000,
+                "temperature": 0.7
+            }
 
-        # Extract and parse the structured content
-        converted_content = json.loads(data["choices"][0]["message"]["content"])
-        logger.info(f"Converted content: {json.dumps(converted_content, indent=2)[:500]}...")
-        return converted_content
+            # Extract and parse the structured content
+            try:
+                converted_content = json.loads(_post_chat_completion(payload))
+            except json.JSONDecodeError as e:
+                record_outcome(template_key, model, False)
+                if attempt == len(models):
+                    raise
+                logger.warning(f"Model {model} returned invalid JSON ({str(e)}), escalating to {models[attempt]}")
+                continue
+            record_outcome(template_key, model, True)
+            logger.info(f"Converted content with {model}: {json.dumps(converted_content, indent=2)[:500]}...")
+            return converted_content
 
     except requests.exceptions.HTTPError as e:
-        if response.status_code == 401:
+        if e.response is not None and e.response.status_code == 401:
             logger.error("API authentication failed: Invalid or missing API key.")
             raise Exception("Conversion failed: Invalid or missing API key. Please contact the administrator to verify the API configuration.")
         logger.error(f"Error converting content: {str(e)}")
         raise Exception(f"Conversion failed due to an API error: {str(e)}")
     except Exception as e:
         logger.error(f"Error converting content: {str(e)}")
-        raise Exception(f"Conversion failed: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Conversion failed: {str(e)}")
+
+def split_content(content, chunk_tokens):
+    """
+    Split serialized content into chunks of at most chunk_tokens, on line boundaries.
+
+    Args:
+        content (str): Serialized content, one block per line.
+        chunk_tokens (int): Target maximum tokens per chunk. A single longer line becomes its own chunk.
+
+    Returns:
+        list: Content chunks in document order.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for line in content.split("\n"):
+        tokens = estimate_tokens(line) + 1
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _merge_sections(results):
+    """
+    Merge structured outputs of consecutive chunks, keeping the first occurrence of repeated items.
+    """
+    merged = {}
+    for result in results:
+        for key, value in (result.get("sections") or {}).items():
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(merged[key], list) and isinstance(value, list):
+                merged[key].extend(item for item in value if item not in merged[key])
+            elif isinstance(merged[key], str) and isinstance(value, str):
+                if value and value not in merged[key]:
+                    merged[key] = f"{merged[key]}\n{value}" if merged[key] else value
+            elif isinstance(merged[key], dict) and isinstance(value, dict):
+                for subkey, subvalue in value.items():
+                    merged[key].setdefault(subkey, subvalue)
+            elif not merged[key]:
+                merged[key] = value
+    return {"sections": merged}
+
+def convert_content_chunked(content, template_prompt, conversion_prompt, template_key=None, expected_sections=0):
+    """
+    Convert content with convert_content, fanning out over chunks when it is too large for one call.
+
+    The chunk size and the number of parallel calls come from the shared FanoutController, which adapts
+    them to observed latency, throughput and rate limiting.
+
+    Args:
+        content (str or dict): The raw content extracted from the source document.
+        template_prompt (str): The prompt defining the structure and semantics.
+        conversion_prompt (str): Additional instructions for modifying content (e.g., tone, brevity).
+        template_key (optional): Identifies the template for per-template routing history.
+        expected_sections (int): Number of sections the template expects.
+
+    Returns:
+        dict: Structured content in JSON format, merged across chunks in document order.
+    """
+    content = _normalize_content(content)
+    chunk_tokens, concurrency = fanout_controller.plan()
+    chunks = split_content(content, chunk_tokens)
+    if len(chunks) <= 1:
+        return convert_content(content, template_prompt, conversion_prompt, template_key, expected_sections)
+
+    logger.info(f"Converting {len(chunks)} chunks of up to {chunk_tokens} tokens with {concurrency} parallel calls")
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as executor:
+        results = list(executor.map(
+            lambda chunk: convert_content(chunk, template_prompt, conversion_prompt, template_key, expected_sections),
+            chunks
+        ))
+    return _merge_sections(results)
+
+def pack_documents(contents, max_input_tokens=BATCH_MAX_INPUT_TOKENS, max_documents=BATCH_MAX_DOCUMENTS,
+                   small_document_tokens=BATCH_SMALL_DOCUMENT_TOKENS):
+    """
+    Group document indices into batches that fit a shared input token budget.
+
+    Documents larger than small_document_tokens are never packed and get a batch of their own.
+
+    Args:
+        contents (list): Normalised document strings.
+        max_input_tokens (int): Token budget for the documents of one batch.
+        max_documents (int): Maximum number of documents per batch.
+        small_document_tokens (int): Largest document considered for packing.
+
+    Returns:
+        list: Lists of indices into contents, in input order.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for idx, content in enumerate(contents):
+        tokens = estimate_tokens(content)
+        if tokens > small_document_tokens:
+            batches.append([idx])
+            continue
+        if current and (current_tokens + tokens > max_input_tokens or len(current) >= max_documents):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return sorted(batches, key=lambda batch: batch[0])
+
+def _convert_packed(contents, system_prompt, template_key=None, expected_sections=0):
+    """
+    Convert several documents in one request and split the keyed output.
+
+    Returns:
+        dict: Structured content per document ID ('doc_1', 'doc_2', ...). Documents missing from
+            or malformed in the output are left out.
+
+    Raises:
+        ValueError: If the output is not valid JSON or has no 'documents' object.
+    """
+    doc_ids = [f"doc_{i}" for i in range(1, len(contents) + 1)]
+    batch_prompt = system_prompt + (
+        "\n\n**Batch Mode**:\n"
+        f"The user message contains {len(contents)} independent documents, each starting with a line "
+        f"'{BATCH_DOCUMENT_DELIMITER.format(doc_id='<id>')}'. Convert each one separately and never mix "
+        "content between documents. Return a single JSON object of the form "
+        "{\"documents\": {\"<id>\": {\"sections\": {...}}, ...}} with one entry for every document ID."
+    )
+    user_prompt = "Here are the raw documents to convert:\n\n" + "\n\n".join(
+        BATCH_DOCUMENT_DELIMITER.format(doc_id=doc_id) + "\n" + content
+        for doc_id, content in zip(doc_ids, contents)
+    )
+    model = choose_model(
+        estimate_tokens(batch_prompt) + estimate_tokens(user_prompt), expected_sections, template_key
+    )
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": batch_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "max_tokens": min(3000 * len(contents), 16000),
+        "temperature": 0.7,
+        "response_format": {"type": "json_object"}
+    }
+    try:
+        response = json.loads(_post_chat_completion(payload))
+    except json.JSONDecodeError:
+        record_outcome(template_key, model, False)
+        raise
+    documents = response.get("documents") if isinstance(response, dict) else None
+    if not isinstance(documents, dict):
+        raise ValueError("Batched response has no 'documents' object")
+    record_outcome(template_key, model, True)
+    return {
+        doc_id: {"sections": documents[doc_id]["sections"]}
+        for doc_id in doc_ids
+        if isinstance(documents.get(doc_id), dict) and isinstance(documents[doc_id].get("sections"), dict)
+    }
+
+def convert_content_batch(contents, template_prompt, conversion_prompt, template_key=None, expected_sections=0):
+    """
+    Convert several small documents sharing a template and conversion prompt with as few LLM calls as possible.
+
+    Small documents are packed into one request each batch, with per-document delimiters and a keyed
+    JSON output. If a batched response cannot be parsed, its documents are converted one by one with
+    convert_content; documents missing from an otherwise valid response are converted singly as well.
+
+    Args:
+        contents (list): Raw contents (str or dict) of each source document.
+        template_prompt (str): The prompt defining the structure and semantics.
+        conversion_prompt (str): Additional instructions for modifying content (e.g., tone, brevity).
+        template_key (optional): Identifies the template for per-template routing history.
+        expected_sections (int): Number of sections the template expects.
+
+    Returns:
+        list: Structured content for each document, in input order.
+
+    Raises:
+        Exception: If a fallback single conversion fails.
+    """
+    contents = [_normalize_content(content) for content in contents]
+    system_prompt = _build_system_prompt(template_prompt, conversion_prompt)
+    results = [None] * len(contents)
+
+    for batch in pack_documents(contents):
+        if len(batch) > 1:
+            try:
+                documents = _convert_packed(
+                    [contents[idx] for idx in batch], system_prompt, template_key, expected_sections
+                )
+                for position, idx in enumerate(batch, 1):
+                    results[idx] = documents.get(f"doc_{position}")
+                logger.info(f"Converted {len(documents)} of {len(batch)} documents in one batched request")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # HTTP, connection and timeout errors, or json.JSONDecodeError (a ValueError); fall back to one
+                # request per document
+                logger.warning(f"Batched conversion of {len(batch)} documents failed, falling back to single requests: {str(e)}")
+        for idx in batch:
+            if results[idx] is None:
+                results[idx] = convert_content(
+                    contents[idx], template_prompt, conversion_prompt, template_key, expected_sections
+                )
+    return results
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+from .database import get_db_connection
+from .ir import StructuredDocument
+from .limits import Deadline
+from .output_cache import render_cached
+from .template_artifacts import get_template_artifacts
+
+logger = logging.getLogger(__name__)
+
+def text_hash(text):
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def save_conversion_result(user_id, client_id, structured_content, source_name, method, source_hash=None,
+                           parser_version=None, template_id=None, artifacts=None, conversion_prompt=None):
+    """
+    Store the structured output of a conversion with where it came from.
+
+    Args:
+        user_id (int): The owner.
+        client_id (str): The client's client_id as selected in the form, or '' for none.
+        structured_content (dict or StructuredDocument): The conversion output.
+        source_name (str): The uploaded file name, or a label for pasted text.
+        method (str): 'parsed' (.docx section matcher), 'llm' or 'llm_batch'.
+        source_hash (str, optional): sha256 of the source file or text.
+        parser_version (str, optional): ooxml_reader.PARSER_VERSION for parsed sources.
+        template_id (int, optional): The template the conversion targeted.
+        artifacts (dict, optional): That template's artifacts, for its template and prompt hashes.
+        conversion_prompt (str, optional): The conversion prompt sent to the LLM.
+
+    Returns:
+        int: The new result's id.
+    """
+    structured = StructuredDocument.from_dict(structured_content)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO conversion_results (user_id, client_id, source_name, source_hash, method, parser_version, "
+        "template_id, template_hash, template_prompt_hash, conversion_prompt_hash, content) "
+        "VALUES (%s, (SELECT id FROM clients WHERE user_id = %s AND client_id = %s), %s, %s, %s, %s, %s, %s, %s, %s, %s) "
+        "RETURNING id",
+        (
+            user_id, user_id, client_id or None, (source_name or 'document')[:255], source_hash, method, parser_version,
+            template_id or None, artifacts["template_hash"] if artifacts else None,
+            artifacts["prompt_hash"] if artifacts else None,
+            text_hash(conversion_prompt) if conversion_prompt else None,
+            json.dumps(structured.to_data())
+        )
+    )
+    result_id = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    conn.close()
+    logger.info(f"Stored conversion result {result_id} for user {user_id} ({method}, {len(structured.sections)} sections)")
+    return result_id
+
+
+def list_conversion_results(user_id, limit=50):
+    """
+    Return the user's most recent conversion results (without their content), newest first.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT r.id, r.source_name, r.method, r.created_at, t.template_name, c.name, "
+        "jsonb_array_length(r.content) AS section_count "
+        "FROM conversion_results r "
+        "LEFT JOIN templates t ON r.template_id = t.id "
+        "LEFT JOIN clients c ON r.client_id = c.id "
+        "WHERE r.user_id = %s ORDER BY r.created_at DESC LIMIT %s",
+        (user_id, limit)
+    )
+    results = [
+        {
+            'id': row[0],
+            'source_name': row[1],
+            'method': row[2],
+            'created_at': row[3],
+            'template_name': row[4],
+            'client_name': row[5],
+            'section_count': row[6],
+        }
+        for row in cur.fetchall()
+    ]
+    cur.close()
+    conn.close()
+    return results
+
+
+def get_conversion_result(result_id, user_id):
+    """
+    Return a stored result as (StructuredDocument, template_id), or None if it is not the user's.
+
+    template_id is the template the result was converted for (None if that template was deleted).
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT content, template_id FROM conversion_results WHERE id = %s AND user_id = %s", (result_id, user_id))
+    row = cur.fetchone()
+    cur.close()
+    conn.close()
+    return (StructuredDocument.from_data(row[0]), row[1]) if row else None
+
+
+def get_renderable_templates(user_id):
+    """
+    Return all of the user's templates that have a file, for choosing render targets.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT t.id, t.template_name, c.name FROM templates t LEFT JOIN clients c ON t.client_id = c.id "
+        "WHERE t.user_id = %s AND t.template_file IS NOT NULL ORDER BY t.template_name",
+        (user_id,)
+    )
+    templates = [{'id': row[0], 'template_name': row[1], 'client_name': row[2]} for row in cur.fetchall()]
+    cur.close()
+    conn.close()
+    return templates
+
+
+def render_result(result_id, template_ids, user_id):
+    """
+    Render a stored result against one or more templates, without another LLM call.
+
+    Templates are rendered one after another, each with its own build deadline; identical renders come
+    from the output cache. Rendering is CPU-bound, so threads would not overlap under the gevent worker;
+    the deadline's periodic yields let other requests on the worker run in between.
+
+    Returns:
+        list: One {'template_id', 'key', 'output_file'} per template that has a file, in template_ids order,
+            or None if the result does not exist for this user.
+
+    Raises:
+        DocumentTooComplex: If a render exceeds its build budget.
+    """
+    result = get_conversion_result(result_id, user_id)
+    if result is None:
+        return None
+    structured = result[0]
+    rendered = []
+    for template_id in template_ids:
+        artifacts = get_template_artifacts(template_id, user_id)
+        if not artifacts:
+            continue
+        # The template's own prompt supplies the per-section styles, as at conversion time
+        key, output_file = render_cached(user_id, structured, artifacts, artifacts["section_styles"],
+                                         deadline=Deadline.for_build())
+        rendered.append({'template_id': template_id, 'key': key, 'output_file': output_file})
+    logger.info(f"Rendered result {result_id} against {len(rendered)} templates")
+    return rendered
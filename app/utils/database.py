@@ -65,6 +65,46 @@ def init_db():
         );
     """)
     
+    # What normalize_package removed from the stored template file
+    cur.execute("ALTER TABLE templates ADD COLUMN IF NOT EXISTS package_report JSONB;")
+    
+    # Template analysis precomputed on create/update, so conversions never parse the template
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS template_artifacts (
+            template_id INTEGER PRIMARY KEY REFERENCES templates(id) ON DELETE CASCADE,
+            version VARCHAR(32) NOT NULL,
+            template_hash VARCHAR(64) NOT NULL,
+            prompt_hash VARCHAR(64) NOT NULL,
+            style_profile JSONB NOT NULL,
+            headings JSONB NOT NULL,
+            expected_sections JSONB NOT NULL,
+            compact_prompt TEXT NOT NULL,
+            section_styles JSONB NOT NULL,
+            skeleton BYTEA NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """)
+    
+    # Structured conversion output with its provenance, so it can be re-rendered against any template
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS conversion_results (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            client_id INTEGER REFERENCES clients(id) ON DELETE SET NULL,
+            source_name VARCHAR(255) NOT NULL,
+            source_hash VARCHAR(64),
+            method VARCHAR(16) NOT NULL CHECK (method IN ('parsed', 'llm', 'llm_batch')),
+            parser_version VARCHAR(16),
+            template_id INTEGER REFERENCES templates(id) ON DELETE SET NULL,
+            template_hash VARCHAR(64),
+            template_prompt_hash VARCHAR(64),
+            conversion_prompt_hash VARCHAR(64),
+            content JSONB NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS conversion_results_user_created ON conversion_results (user_id, created_at DESC);")
+    
     # Create template_prompt_associations table
     cur.execute("""
         CREATE TABLE IF NOT EXISTS template_prompt_associations (
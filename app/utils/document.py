@@ -1,40 +1,83 @@
-from docx import Document
+from .serialization import serialize_blocks, normalize_whitespace
+from .ooxml_reader import iter_blocks, PARSER_VERSION
+from .ir import ParsedDocument
+from .cache import TieredCache
+from .metrics import increment
+from io import BytesIO
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
 
-def process_docx(file):
+# Parsed uploads keyed by content hash; PARSE_CACHE_DIR enables the on-disk tier
+parse_cache = TieredCache.from_env('PARSE_CACHE')
+
+def _hash_stream(stream, chunk_size=1024 * 1024):
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        sha256.update(chunk)
+    stream.seek(0)
+    return sha256.hexdigest()
+
+def parse_docx(file, content_hash=None, deadline=None):
+    """
+    Parse a .docx into a ParsedDocument of its non-empty paragraphs and tables, reusing cached results.
+
+    Results are cached by sha256 of the file bytes and PARSER_VERSION, so re-uploading the same
+    source (e.g. to try another template) only costs the hash. File-like objects are read in place
+    (hashed in chunks, then parsed from the same stream) rather than copied into memory.
+
+    Args:
+        file: The .docx file as bytes or a seekable file-like object.
+        content_hash (str, optional): The sha256 hex digest of the bytes, if already known
+            (e.g. computed while the upload was received).
+        deadline (Deadline, optional): The request's parse budget, shared with later stages such as section
+            matching; defaults to a new Deadline.for_parse().
+
+    Returns:
+        ParsedDocument: The parsed blocks in document order.
+    """
+    stream = BytesIO(file) if isinstance(file, bytes) else file
+    content_hash = content_hash or _hash_stream(stream)
+    cache_key = f"docx-v{PARSER_VERSION}-{content_hash}"
+
+    cached = parse_cache.get(cache_key)
+    if cached is not None:
+        increment("parse_cache", result="hit")
+        return ParsedDocument.loads(cached)
+    increment("parse_cache", result="miss")
+
+    blocks = []
+    stream.seek(0)
+    for block in iter_blocks(stream, deadline=deadline):
+        if block.kind == "paragraph":
+            block.text = block.text.strip()
+            if not block.text:
+                continue
+        blocks.append(block)
+    parsed = ParsedDocument(blocks)
+    parse_cache.set(cache_key, parsed.dumps())
+    return parsed
+
+def process_docx(file, strip_boilerplate=False, content_hash=None):
     """
-    Process a .docx file and extract its content as a string.
+    Process a .docx file and extract its content as a compact string for the LLM.
     
     Args:
         file: The .docx file stream.
+        strip_boilerplate (bool): Drop page numbers and similar boilerplate lines.
+        content_hash (str, optional): The sha256 of the file, if already known.
     
     Returns:
         str: The extracted content as a string.
     """
-    doc = Document(file)
-    content = []
-    source_sections = []
-
-    # Extract tables
-    for table in doc.tables:
-        table_content = []
-        for row in table.rows:
-            row_content = [cell.text.strip() for cell in row.cells]
-            table_content.append(row_content)
-        content.append(f"Table: {table_content}")
-        logger.info(f"Extracted table: {table_content}")
-
-    # Extract paragraphs and determine section order
-    for para in doc.paragraphs:
-        text = para.text.strip()
-        if text:
-            content.append(text)
-            source_sections.append(text)
-
-    logger.info(f"Source section order: {source_sections}")
-    return "\n\n".join(content)
+    parsed = parse_docx(file, content_hash=content_hash)
+    for block in parsed.blocks:
+        if block.kind == "table":
+            logger.info(f"Extracted table with {len(block.rows)} rows")
+    logger.info(f"Source section order: {[block.text for block in parsed.paragraphs()]}")
+    return serialize_blocks(parsed.blocks, strip_boilerplate=strip_boilerplate)
 
 def process_text_input(text):
     """
@@ -44,6 +87,6 @@ def process_text_input(text):
         text (str): The raw text input.
     
     Returns:
-        str: The processed text.
+        str: The processed text with whitespace normalised.
     """
-    return text
\ No newline at end of file
+    return normalize_whitespace(text)
\ No newline at end of file
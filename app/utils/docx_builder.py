@@ -1,224 +1,162 @@
 from docx import Document
-from docx.shared import Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from copy import deepcopy
 from io import BytesIO
+import hashlib
+import os
 import logging
+from .cache import LRUCache
+from .ir import StructuredDocument, SECTION_TEXT, SECTION_LIST, SECTION_TABLES
+from .limits import Deadline, ElementBudget
+from .template_styles import get_style_profile
+from .style_compiler import StyleCompiler, resolve_format, name_format, contact_format, section_header_format
+from .ooxml_writer import OoxmlWriter, DIRECT_WRITER_THRESHOLD
 
 logger = logging.getLogger(__name__)
 
-def create_reformatted_docx(converted_content, template_file):
+# Bump whenever create_reformatted_docx's output changes for the same inputs, so cached outputs are not served
+BUILDER_VERSION = "2"
+
+# Parsed skeleton packages keyed by content hash, as (skeleton size, Document); renders work on deep copies
+skeleton_documents = LRUCache(
+    maxsize=int(os.environ.get('SKELETON_CACHE_SIZE', 32)),
+    max_bytes=int(float(os.environ.get('SKELETON_CACHE_MAX_MB', 64)) * 1024 * 1024),
+    sizeof=lambda entry: entry[0]
+)
+
+
+def new_output_document(skeleton=None):
+    """
+    Return a fresh Document to build an output into: a clone of the parsed skeleton, parsed once per distinct skeleton.
+    """
+    if not skeleton:
+        return Document()
+    key = hashlib.sha256(skeleton).hexdigest()
+    entry = skeleton_documents.get(key)
+    if entry is None:
+        entry = (len(skeleton), Document(BytesIO(skeleton)))
+        skeleton_documents.set(key, entry)
+    return deepcopy(entry[1])
+
+
+def output_size(structured):
+    """
+    Count the paragraphs and table cells create_reformatted_docx will write for a StructuredDocument.
+    """
+    size = 0
+    for section in structured.sections:
+        if section.kind == SECTION_TABLES:
+            size += sum(len(table.rows) * table.column_count for table in section.items)
+        elif section.kind == SECTION_LIST:
+            size += len(section.items)
+        size += 1
+    return size
+
+
+def create_reformatted_docx(converted_content, template_file=None, section_styles=None, deadline=None,
+                            style_profile=None, skeleton=None, style_mode=None, direct_writer=None):
     """
     Create a reformatted .docx file by applying styles from the template file to the converted content.
     
     Args:
-        converted_content (dict): Structured content in JSON format with sections.
-        template_file (bytes): The template .docx file as a byte string.
+        converted_content (dict or StructuredDocument): Structured content, either the {"sections": {...}}
+            dict returned by the LLM conversion or a StructuredDocument from the section matcher.
+        template_file (bytes): The template .docx file as a byte string. Not needed when style_profile is given.
+        section_styles (dict, optional): Per-section header styles keyed by section key, as split
+            from the template prompt by compact_template_prompt. These override the template's header style.
+        deadline (Deadline, optional): Wall-clock budget; defaults to Deadline.for_build().
+        style_profile (dict, optional): The template's precomputed style profile (see template_artifacts).
+        skeleton (bytes, optional): The precomputed empty package to build into (see template_artifacts.build_skeleton).
+        style_mode (str, optional): "direct" (formatting on every paragraph) or "named" (DR * styles in
+            styles.xml referenced by ID); defaults to OUTPUT_STYLE_MODE.
+        direct_writer (bool, optional): Write document.xml with OoxmlWriter instead of python-docx objects.
+            By default it is used for outputs of at least DIRECT_WRITER_THRESHOLD paragraphs and table cells.
     
     Returns:
         bytes: The reformatted .docx file as a byte string.
+
+    Raises:
+        DocumentTooComplex: If the template or the content exceeds the build budgets.
     """
     try:
-        # Load the template file
-        template_stream = BytesIO(template_file)
-        template_doc = Document(template_stream)
-
-        # Extract styles from the template
-        styles = {"header": None, "body": None}
-        for para in template_doc.paragraphs:
-            if not para.text.strip():
-                continue
-            # Determine if this paragraph is a header (based on bold, size > 11pt, or uppercase)
-            is_header = (
-                para.runs and (
-                    para.runs[0].bold or
-                    (para.runs[0].font.size and para.runs[0].font.size.pt > 11) or
-                    para.text.isupper()
-                )
-            )
-            style_type = "header" if is_header else "body"
-            
-            # Extract style properties
-            run = para.runs[0] if para.runs else None
-            style = {
-                "font_name": run.font.name if run and run.font.name else "Arial",
-                "font_size_pt": run.font.size.pt if run and run.font.size else (12 if is_header else 11),
-                "bold": run.bold if run and run.bold is not None else is_header,
-                "color_rgb": (
-                    [run.font.color.rgb.red, run.font.color.rgb.green, run.font.color.rgb.blue]
-                    if run and run.font.color and run.font.color.rgb
-                    else [0, 0, 0]
-                ),
-                "alignment": {
-                    WD_ALIGN_PARAGRAPH.LEFT: "left",
-                    WD_ALIGN_PARAGRAPH.CENTER: "center",
-                    WD_ALIGN_PARAGRAPH.RIGHT: "right",
-                    WD_ALIGN_PARAGRAPH.JUSTIFY: "justify"
-                }.get(para.paragraph_format.alignment, "center" if is_header else "left"),
-                "spacing_before_pt": (
-                    para.paragraph_format.space_before.pt
-                    if para.paragraph_format.space_before
-                    else 12 if is_header else 6
-                ),
-                "spacing_after_pt": (
-                    para.paragraph_format.space_after.pt
-                    if para.paragraph_format.space_after
-                    else 12 if is_header else 6
-                ),
-                "is_horizontal_list": "•" in para.text and para.text.count('\n') <= 1
-            }
-            # Only set the style if not already set to preserve the first occurrence
-            if styles[style_type] is None:
-                styles[style_type] = style
-
-        logger.debug(f"Extracted styles from template: {styles}")
+        deadline = deadline or Deadline.for_build()
+        budget = ElementBudget()
+
+        # Header/body styles of the template, extracted once per distinct template file
+        styles = style_profile or get_style_profile(template_file)
+
+        logger.debug(f"Template styles: header={styles['header']}, body={styles['body']}")
+        section_styles = section_styles or {}
+        structured = StructuredDocument.from_dict(converted_content)
 
         # Create a new document for the output
-        doc = Document()
+        doc = new_output_document(skeleton)
+
+        # Each distinct format is compiled into a w:pPr/w:rPr fragment once and stamped onto every paragraph
+        compiler = StyleCompiler(doc, style_mode)
+        if direct_writer is None:
+            direct_writer = output_size(structured) >= DIRECT_WRITER_THRESHOLD
+        # Paragraphs and tables go through the same interface either way
+        writer = OoxmlWriter(compiler) if direct_writer else compiler
+        header_style = styles.get("header") or {}
+        body_format = resolve_format(styles.get("body") or {})
 
         # Apply styles to the converted content
         # First, add the name (header style, typically larger and centered)
-        if "name" in converted_content["sections"]:
-            para = doc.add_paragraph(converted_content["sections"]["name"])
-            style = styles.get("header", {})
-            run = para.runs[0]
-            run.font.name = style.get("font_name", "Arial")
-            run.font.size = Pt(style.get("font_size_pt", 14) + 2)  # Slightly larger for name
-            run.bold = style.get("bold", True)
-            run.font.color.rgb = RGBColor(*style.get("color_rgb", [0, 0, 0]))
-            para.paragraph_format.alignment = {
-                "left": WD_ALIGN_PARAGRAPH.LEFT,
-                "center": WD_ALIGN_PARAGRAPH.CENTER,
-                "right": WD_ALIGN_PARAGRAPH.RIGHT,
-                "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
-            }.get("center", WD_ALIGN_PARAGRAPH.CENTER)
-            para.paragraph_format.space_before = Pt(style.get("spacing_before_pt", 12))
-            para.paragraph_format.space_after = Pt(style.get("spacing_after_pt", 12))
+        name = structured.get("name")
+        if name is not None:
+            fmt = name_format({**header_style, **section_styles.get("name", {})})
+            writer.add_paragraph(name.items if name.kind == SECTION_TEXT else " ".join(name.items), fmt, role="name")
 
         # Add contact info (header style, centered)
-        if "contact" in converted_content["sections"]:
-            para = doc.add_paragraph(converted_content["sections"]["contact"])
-            style = styles.get("header", {})
-            run = para.runs[0]
-            run.font.name = style.get("font_name", "Arial")
-            run.font.size = Pt(style.get("font_size_pt", 11))
-            run.bold = False  # Contact info typically not bold
-            run.font.color.rgb = RGBColor(*style.get("color_rgb", [0, 0, 0]))
-            para.paragraph_format.alignment = {
-                "left": WD_ALIGN_PARAGRAPH.LEFT,
-                "center": WD_ALIGN_PARAGRAPH.CENTER,
-                "right": WD_ALIGN_PARAGRAPH.RIGHT,
-                "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
-            }.get("center", WD_ALIGN_PARAGRAPH.CENTER)
-            para.paragraph_format.space_before = Pt(style.get("spacing_before_pt", 12))
-            para.paragraph_format.space_after = Pt(style.get("spacing_after_pt", 12))
+        contact = structured.get("contact")
+        if contact is not None:
+            fmt = contact_format({**header_style, **section_styles.get("contact", {})})
+            writer.add_paragraph(contact.items if contact.kind == SECTION_TEXT else " | ".join(contact.items), fmt, role="contact")
 
         # Add sections (e.g., professional summary, core competencies, etc.)
-        for section_key, section_content in converted_content["sections"].items():
+        for section in structured.sections:
+            deadline.check()
+            section_key = section.key
+            section_content = section.items
             if section_key in ["name", "contact"]:
                 continue  # Already handled
 
             # Add section header
-            section_header = section_key.replace("_", " ").title()
-            para = doc.add_paragraph(section_header)
-            style = styles.get("header", {})
-            run = para.runs[0]
-            run.font.name = style.get("font_name", "Arial")
-            run.font.size = Pt(style.get("font_size_pt", 12))
-            run.bold = style.get("bold", True)
-            run.font.color.rgb = RGBColor(*style.get("color_rgb", [0, 0, 0]))
-            para.paragraph_format.alignment = {
-                "left": WD_ALIGN_PARAGRAPH.LEFT,
-                "center": WD_ALIGN_PARAGRAPH.CENTER,
-                "right": WD_ALIGN_PARAGRAPH.RIGHT,
-                "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
-            }.get(style.get("alignment", "center"), WD_ALIGN_PARAGRAPH.CENTER)
-            para.paragraph_format.space_before = Pt(style.get("spacing_before_pt", 12))
-            para.paragraph_format.space_after = Pt(style.get("spacing_after_pt", 12))
+            header_format = section_header_format({**header_style, **section_styles.get(section_key, {})})
+            writer.add_paragraph(section.title, header_format, role="header")
 
             # Add section content
-            style = styles.get("body", {})
-            if section_key == "tables":
+            if section.kind == SECTION_TABLES:
                 # Handle tables by adding them as actual tables in the doc
                 for table_data in section_content:
-                    table = doc.add_table(rows=len(table_data), cols=len(table_data[0]) if table_data else 1)
-                    for row_idx, row in enumerate(table_data):
-                        for col_idx, cell_text in enumerate(row):
-                            cell = table.cell(row_idx, col_idx)
-                            cell.text = cell_text
-                            for paragraph in cell.paragraphs:
-                                for run in paragraph.runs:
-                                    run.font.name = style.get("font_name", "Arial")
-                                    run.font.size = Pt(style.get("font_size_pt", 11))
-                                    run.bold = style.get("bold", False)
-                                    run.font.color.rgb = RGBColor(*style.get("color_rgb", [0, 0, 0]))
-                                paragraph.paragraph_format.alignment = {
-                                    "left": WD_ALIGN_PARAGRAPH.LEFT,
-                                    "center": WD_ALIGN_PARAGRAPH.CENTER,
-                                    "right": WD_ALIGN_PARAGRAPH.RIGHT,
-                                    "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
-                                }.get(style.get("alignment", "left"), WD_ALIGN_PARAGRAPH.LEFT)
-                                paragraph.paragraph_format.space_before = Pt(style.get("spacing_before_pt", 6))
-                                paragraph.paragraph_format.space_after = Pt(style.get("spacing_after_pt", 6))
-            elif isinstance(section_content, list):
+                    budget.add(len(table_data.rows) * table_data.column_count)
+                    writer.add_table(table_data, body_format, deadline)
+            elif section.kind == SECTION_LIST:
                 # Handle lists (e.g., core competencies, professional experience bullets)
-                if section_key == "core_competencies" and style.get("is_horizontal_list", False):
+                if section_key == "core_competencies" and (styles.get("body") or {}).get("is_horizontal_list", False):
                     # Horizontal list with dots
-                    para = doc.add_paragraph(" • ".join(section_content))
-                    run = para.runs[0]
-                    run.font.name = style.get("font_name", "Arial")
-                    run.font.size = Pt(style.get("font_size_pt", 11))
-                    run.bold = style.get("bold", False)
-                    run.font.color.rgb = RGBColor(*style.get("color_rgb", [0, 0, 0]))
-                    para.paragraph_format.alignment = {
-                        "left": WD_ALIGN_PARAGRAPH.LEFT,
-                        "center": WD_ALIGN_PARAGRAPH.CENTER,
-                        "right": WD_ALIGN_PARAGRAPH.RIGHT,
-                        "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
-                    }.get(style.get("alignment", "left"), WD_ALIGN_PARAGRAPH.LEFT)
-                    para.paragraph_format.space_before = Pt(style.get("spacing_before_pt", 6))
-                    para.paragraph_format.space_after = Pt(style.get("spacing_after_pt", 6))
+                    writer.add_paragraph(" • ".join(section_content), body_format)
                 else:
                     # Bullet points
+                    budget.add(len(section_content))
                     for item in section_content:
-                        para = doc.add_paragraph(item, style="List Bullet")
-                        run = para.runs[0]
-                        run.font.name = style.get("font_name", "Arial")
-                        run.font.size = Pt(style.get("font_size_pt", 11))
-                        run.bold = style.get("bold", False)
-                        run.font.color.rgb = RGBColor(*style.get("color_rgb", [0, 0, 0]))
-                        para.paragraph_format.alignment = {
-                            "left": WD_ALIGN_PARAGRAPH.LEFT,
-                            "center": WD_ALIGN_PARAGRAPH.CENTER,
-                            "right": WD_ALIGN_PARAGRAPH.RIGHT,
-                            "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
-                        }.get(style.get("alignment", "left"), WD_ALIGN_PARAGRAPH.LEFT)
-                        para.paragraph_format.space_before = Pt(style.get("spacing_before_pt", 6))
-                        para.paragraph_format.space_after = Pt(style.get("spacing_after_pt", 6))
+                        deadline.check()
+                        writer.add_paragraph(item, body_format, paragraph_style="List Bullet", role="bullet")
             else:
                 # Handle paragraphs (e.g., professional summary)
-                para = doc.add_paragraph(section_content)
-                run = para.runs[0]
-                run.font.name = style.get("font_name", "Arial")
-                run.font.size = Pt(style.get("font_size_pt", 11))
-                run.bold = style.get("bold", False)
-                run.font.color.rgb = RGBColor(*style.get("color_rgb", [0, 0, 0]))
-                para.paragraph_format.alignment = {
-                    "left": WD_ALIGN_PARAGRAPH.LEFT,
-                    "center": WD_ALIGN_PARAGRAPH.CENTER,
-                    "right": WD_ALIGN_PARAGRAPH.RIGHT,
-                    "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
-                }.get(style.get("alignment", "left"), WD_ALIGN_PARAGRAPH.LEFT)
-                para.paragraph_format.space_before = Pt(style.get("spacing_before_pt", 6))
-                para.paragraph_format.space_after = Pt(style.get("spacing_after_pt", 6))
+                writer.add_paragraph(section_content, body_format)
 
         # Save the new document to a byte stream
-        output_stream = BytesIO()
-        doc.save(output_stream)
-        output_file = output_stream.getvalue()
-        output_stream.close()
-        template_stream.close()
+        if direct_writer:
+            output_file = writer.save()
+        else:
+            output_stream = BytesIO()
+            doc.save(output_stream)
+            output_file = output_stream.getvalue()
+            output_stream.close()
 
-        logger.info(f"Created reformatted document (size: {len(output_file)} bytes)")
+        logger.info(f"Created reformatted document (size: {len(output_file)} bytes, "
+                    f"{'direct writer' if direct_writer else 'python-docx'})")
         return output_file
 
     except Exception as e:
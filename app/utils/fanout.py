@@ -0,0 +1,164 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from .metrics import register_collector, set_gauge, increment
+
+logger = logging.getLogger(__name__)
+
+
+class FanoutController:
+    """
+    AIMD controller for the chunk size and parallelism of chunked LLM conversions.
+
+    Every LLM call reports its latency, token count and whether it hit a 429. Rate limiting halves the
+    concurrency and shrinks chunks (multiplicative decrease). At the end of each window of clean calls the
+    latency and throughput EWMAs decide the next step: latency above target removes one worker, aggregate
+    throughput (per-call tokens per second times concurrency) that fell after the last added worker removes
+    it again, and otherwise one worker is added (additive increase). Chunk size follows per-call latency:
+    chunks shrink when calls exceed the latency target and grow while calls finish well inside it.
+    """
+
+    def __init__(self, chunk_tokens=2000, min_chunk_tokens=500, max_chunk_tokens=6000,
+                 concurrency=4, min_concurrency=1, max_concurrency=12,
+                 target_latency_s=20.0, window=8, history=50):
+        self.chunk_tokens = chunk_tokens
+        self.min_chunk_tokens = min_chunk_tokens
+        self.max_chunk_tokens = max_chunk_tokens
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency_s = target_latency_s
+        self.window = window
+        self.latency_ewma = None
+        self.tokens_per_second_ewma = None
+        self.calls = 0
+        self.rate_limited = 0
+        self._clean_calls = 0
+        # Aggregate throughput when a worker was last added, to check the addition paid off
+        self._throughput_at_increase = None
+        self._decisions = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            chunk_tokens=int(os.environ.get('FANOUT_CHUNK_TOKENS', 2000)),
+            min_chunk_tokens=int(os.environ.get('FANOUT_MIN_CHUNK_TOKENS', 500)),
+            max_chunk_tokens=int(os.environ.get('FANOUT_MAX_CHUNK_TOKENS', 6000)),
+            concurrency=int(os.environ.get('FANOUT_CONCURRENCY', 4)),
+            max_concurrency=int(os.environ.get('FANOUT_MAX_CONCURRENCY', 12)),
+            target_latency_s=float(os.environ.get('FANOUT_TARGET_LATENCY_S', 20)),
+        )
+
+    def plan(self):
+        """
+        Return the current (chunk_tokens, concurrency) to use for a fan-out.
+        """
+        with self._lock:
+            return self.chunk_tokens, self.concurrency
+
+    def _decide(self, action, reason):
+        decision = {
+            "at": round(time.time(), 3),
+            "action": action,
+            "reason": reason,
+            "chunk_tokens": self.chunk_tokens,
+            "concurrency": self.concurrency,
+        }
+        self._decisions.append(decision)
+        logger.info(f"Fan-out controller: {action} ({reason}) -> chunk_tokens={self.chunk_tokens}, concurrency={self.concurrency}")
+
+    def record(self, latency_s, tokens=0, rate_limited=0):
+        """
+        Record the outcome of one LLM call and adjust the plan.
+
+        Args:
+            latency_s (float): Wall-clock latency of the call, including retries.
+            tokens (int): Total tokens processed by the call (prompt plus completion), if known.
+            rate_limited (int): Number of 429 responses seen while making the call.
+        """
+        with self._lock:
+            self.calls += 1
+            alpha = 0.3
+            self.latency_ewma = latency_s if self.latency_ewma is None else (1 - alpha) * self.latency_ewma + alpha * latency_s
+            if tokens and latency_s > 0:
+                tps = tokens / latency_s
+                self.tokens_per_second_ewma = tps if self.tokens_per_second_ewma is None else (1 - alpha) * self.tokens_per_second_ewma + alpha * tps
+
+            if rate_limited:
+                self.rate_limited += rate_limited
+                self._clean_calls = 0
+                self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                self.chunk_tokens = max(self.min_chunk_tokens, int(self.chunk_tokens * 0.75))
+                self._decide("decrease", f"{rate_limited} rate-limited responses")
+                return
+
+            if self.latency_ewma > self.target_latency_s and self.chunk_tokens > self.min_chunk_tokens:
+                self.chunk_tokens = max(self.min_chunk_tokens, int(self.chunk_tokens * 0.75))
+                self._decide("shrink_chunks", f"latency {self.latency_ewma:.1f}s above target")
+
+            self._clean_calls += 1
+            if self._clean_calls < self.window:
+                return
+            self._clean_calls = 0
+            throughput = None
+            if self.tokens_per_second_ewma is not None:
+                throughput = self.tokens_per_second_ewma * self.concurrency
+
+            if self.latency_ewma > self.target_latency_s:
+                self._throughput_at_increase = None
+                if self.concurrency > self.min_concurrency:
+                    self.concurrency -= 1
+                    self._decide("decrease", f"latency {self.latency_ewma:.1f}s above target")
+                return
+            if (throughput is not None and self._throughput_at_increase is not None
+                    and throughput < 0.9 * self._throughput_at_increase and self.concurrency > self.min_concurrency):
+                # The last added worker made the fan-out slower overall; the provider is queueing
+                self.concurrency -= 1
+                self._decide("decrease", f"throughput fell to {throughput:.0f} from {self._throughput_at_increase:.0f} tokens/s")
+                self._throughput_at_increase = None
+                return
+
+            changed = False
+            if self.concurrency < self.max_concurrency:
+                self._throughput_at_increase = throughput
+                self.concurrency += 1
+                changed = True
+            if self.latency_ewma < 0.5 * self.target_latency_s and self.chunk_tokens < self.max_chunk_tokens:
+                self.chunk_tokens = min(self.max_chunk_tokens, self.chunk_tokens + self.min_chunk_tokens)
+                changed = True
+            if changed:
+                self._decide("increase", f"{self.window} calls within the latency target")
+
+    def snapshot(self):
+        """
+        Return the controller state and recent decisions for the metrics endpoint.
+        """
+        with self._lock:
+            return {
+                "chunk_tokens": self.chunk_tokens,
+                "concurrency": self.concurrency,
+                "latency_ewma_s": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                "tokens_per_second_ewma": round(self.tokens_per_second_ewma, 1) if self.tokens_per_second_ewma is not None else None,
+                "calls": self.calls,
+                "rate_limited": self.rate_limited,
+                "rate_limited_ratio": round(self.rate_limited / self.calls, 4) if self.calls else 0.0,
+                "decisions": list(self._decisions),
+            }
+
+
+fanout_controller = FanoutController.from_env()
+register_collector("fanout", fanout_controller.snapshot)
+
+
+def record_llm_call(latency_s, tokens=0, rate_limited=0):
+    """
+    Report one LLM call to the shared controller and the metrics counters.
+    """
+    increment("llm_calls")
+    if rate_limited:
+        increment("llm_rate_limited", rate_limited)
+    set_gauge("llm_last_latency_s", round(latency_s, 3))
+    fanout_controller.record(latency_s, tokens, rate_limited)
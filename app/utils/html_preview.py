@@ -0,0 +1,134 @@
+from html import escape
+import re
+import logging
+from .ir import StructuredDocument, SECTION_TEXT, SECTION_LIST, SECTION_TABLES
+from .style_compiler import FORMAT_KEYS, resolve_format, name_format, contact_format, section_header_format
+
+logger = logging.getLogger(__name__)
+
+# Width of the preview page, matching a Letter page with 1" margins
+PAGE_WIDTH_IN = 6.5
+
+# Template font names end up in CSS; anything outside this set is dropped
+_UNSAFE_FONT_CHARS = re.compile(r"[^\w \-.]")
+
+
+def _css(fmt):
+    red, green, blue = fmt["color_rgb"]
+    return (
+        f"font-family: '{_UNSAFE_FONT_CHARS.sub('', str(fmt['font_name']))}', sans-serif; font-size: {fmt['font_size_pt']}pt; "
+        f"font-weight: {'bold' if fmt['bold'] else 'normal'}; color: #{red:02x}{green:02x}{blue:02x}; "
+        f"text-align: {fmt['alignment']}; margin: {fmt['spacing_before_pt']}pt 0 {fmt['spacing_after_pt']}pt 0;"
+    )
+
+
+def _text(text):
+    # Tabs and line breaks as the builder's runs render them
+    return escape(text).replace("\t", "&emsp;").replace("\r\n", "<br>").replace("\r", "<br>").replace("\n", "<br>")
+
+
+class _PreviewWriter:
+    """
+    Collects preview markup, turning each distinct format into one CSS class.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self._classes = {}
+
+    def css_class(self, fmt):
+        key = tuple(fmt[name] for name in FORMAT_KEYS)
+        css_class = self._classes.get(key)
+        if css_class is None:
+            css_class = self._classes[key] = f"f{len(self._classes)}"
+        return css_class
+
+    def paragraph(self, text, fmt, tag="p"):
+        self.parts.append(f'<{tag} class="{self.css_class(fmt)}">{_text(text)}</{tag}>')
+
+    def table(self, table_data, fmt):
+        css_class = self.css_class(fmt)
+        # Cells covered by a merge are skipped; the merge origin spans them
+        spans = {}
+        covered = set()
+        for row_idx, col_idx, row_span, col_span in table_data.merges:
+            spans[(row_idx, col_idx)] = (row_span, col_span)
+            covered.update(
+                (r, c) for r in range(row_idx, row_idx + row_span) for c in range(col_idx, col_idx + col_span)
+            )
+        rows = []
+        for row_idx, row in enumerate(table_data.rows):
+            cells = []
+            for col_idx in range(table_data.column_count):
+                span = spans.get((row_idx, col_idx))
+                if span is None and (row_idx, col_idx) in covered:
+                    continue
+                text = row[col_idx] if col_idx < len(row) else ""
+                attributes = ""
+                if span is not None:
+                    attributes = f' rowspan="{span[0]}" colspan="{span[1]}"'
+                cells.append(f'<td{attributes}><p class="{css_class}">{_text(text)}</p></td>')
+            rows.append(f"<tr>{''.join(cells)}</tr>")
+        self.parts.append(f"<table>{''.join(rows)}</table>")
+
+    def stylesheet(self):
+        rules = [f".docx-preview .{css_class} {{ {_css(dict(zip(FORMAT_KEYS, key)))} }}"
+                 for key, css_class in self._classes.items()]
+        return "\n".join([
+            f".docx-preview {{ max-width: {PAGE_WIDTH_IN}in; margin: 0 auto; padding: 1in 0; background: #fff; }}",
+            ".docx-preview table { width: 100%; border-collapse: collapse; }",
+            ".docx-preview td { border: 1px solid #999; padding: 0 4pt; vertical-align: top; }",
+            ".docx-preview ul { margin: 0; padding-left: 18pt; }",
+            *rules,
+        ])
+
+
+def render_preview(converted_content, style_profile, section_styles=None):
+    """
+    Render structured content as lightweight HTML styled like create_reformatted_docx's output.
+
+    Uses the same formats as the builder (template header/body styles with per-section overrides) but no
+    python-docx, so a preview takes milliseconds. Page setup, headers and footers are not shown.
+
+    Args:
+        converted_content (dict or StructuredDocument): Structured content, as for create_reformatted_docx.
+        style_profile (dict): The template's style profile.
+        section_styles (dict, optional): Per-section header styles keyed by section key.
+
+    Returns:
+        str: A <style> element followed by a <div class="docx-preview">, safe to embed in a page.
+    """
+    structured = StructuredDocument.from_dict(converted_content)
+    section_styles = section_styles or {}
+    header_style = style_profile.get("header") or {}
+    body_style = style_profile.get("body") or {}
+    body_format = resolve_format(body_style)
+    writer = _PreviewWriter()
+
+    name = structured.get("name")
+    if name is not None:
+        writer.paragraph(name.items if name.kind == SECTION_TEXT else " ".join(name.items),
+                         name_format({**header_style, **section_styles.get("name", {})}), tag="h1")
+    contact = structured.get("contact")
+    if contact is not None:
+        writer.paragraph(contact.items if contact.kind == SECTION_TEXT else " | ".join(contact.items),
+                         contact_format({**header_style, **section_styles.get("contact", {})}))
+
+    for section in structured.sections:
+        if section.key in ["name", "contact"]:
+            continue
+        writer.paragraph(section.title, section_header_format({**header_style, **section_styles.get(section.key, {})}), tag="h2")
+        if section.kind == SECTION_TABLES:
+            for table_data in section.items:
+                writer.table(table_data, body_format)
+        elif section.kind == SECTION_LIST:
+            if section.key == "core_competencies" and body_style.get("is_horizontal_list", False):
+                writer.paragraph(" • ".join(section.items), body_format)
+            else:
+                css_class = writer.css_class(body_format)
+                items = "".join(f'<li class="{css_class}">{_text(item)}</li>' for item in section.items)
+                writer.parts.append(f"<ul>{items}</ul>")
+        else:
+            writer.paragraph(section.items, body_format)
+
+    return f"<style>\n{writer.stylesheet()}\n</style>\n<div class=\"docx-preview\">{''.join(writer.parts)}</div>"
@@ -0,0 +1,223 @@
+import json
+
+# Compact intermediate representation shared by the parser, section matcher, LLM serializer and
+# docx builder. All classes use __slots__ and convert to and from plain lists (to_data/from_data),
+# which dumps/loads encode as compact JSON for caching and process handoff.
+
+SECTION_TEXT = "text"
+SECTION_LIST = "list"
+SECTION_TABLES = "tables"
+
+
+class Run:
+    __slots__ = ("text", "bold", "italic", "size_pt", "font_name", "color_rgb")
+
+    def __init__(self, text, bold=None, italic=None, size_pt=None, font_name=None, color_rgb=None):
+        self.text = text
+        self.bold = bold
+        self.italic = italic
+        self.size_pt = size_pt
+        self.font_name = font_name
+        self.color_rgb = color_rgb
+
+    def to_data(self):
+        return [self.text, self.bold, self.italic, self.size_pt, self.font_name, self.color_rgb]
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(*data)
+
+
+class Paragraph:
+    __slots__ = ("text", "style_id", "runs")
+    kind = "paragraph"
+
+    def __init__(self, text, style_id=None, runs=()):
+        self.text = text
+        self.style_id = style_id
+        self.runs = runs
+
+    def to_data(self):
+        return ["p", self.text, self.style_id, [run.to_data() for run in self.runs]]
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(data[1], data[2], tuple(Run.from_data(run) for run in data[3]))
+
+
+class Table:
+    """
+    A table as a dense row-major grid of cell text.
+
+    merges lists merged regions as [row, col, row_span, col_span]; text sits at the top-left cell of
+    each region and the covered cells are ''.
+    """
+    __slots__ = ("rows", "merges")
+    kind = "table"
+
+    def __init__(self, rows, merges=()):
+        self.rows = rows
+        self.merges = list(merges)
+
+    @property
+    def column_count(self):
+        return max((len(row) for row in self.rows), default=0)
+
+    def to_data(self):
+        if self.merges:
+            return ["t", self.rows, self.merges]
+        return ["t", self.rows]
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(data[1], data[2] if len(data) > 2 else ())
+
+    @classmethod
+    def coerce(cls, value):
+        """
+        Accept a Table or a list of rows (as returned by the LLM) and return a Table.
+        """
+        if isinstance(value, cls):
+            return value
+        return cls([[_as_text(cell) for cell in row] if isinstance(row, list) else [_as_text(row)] for row in value or []])
+
+
+def block_from_data(data):
+    return Paragraph.from_data(data) if data[0] == "p" else Table.from_data(data)
+
+
+class ParsedDocument:
+    """
+    The paragraphs and tables of a source document, in document order.
+    """
+    __slots__ = ("blocks",)
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def paragraphs(self):
+        return [block for block in self.blocks if block.kind == "paragraph"]
+
+    def to_data(self):
+        return [block.to_data() for block in self.blocks]
+
+    @classmethod
+    def from_data(cls, data):
+        return cls([block_from_data(item) for item in data])
+
+    def dumps(self):
+        return dumps(self.to_data())
+
+    @classmethod
+    def loads(cls, payload):
+        return cls.from_data(loads(payload))
+
+
+def _as_text(value):
+    """
+    Flatten an LLM-produced value into display text.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return " | ".join(_as_text(item) for item in value.values() if item)
+    if isinstance(value, list):
+        return ", ".join(_as_text(item) for item in value if item)
+    return str(value)
+
+
+class Section:
+    __slots__ = ("key", "kind", "items")
+
+    def __init__(self, key, kind, items):
+        self.key = key
+        self.kind = kind
+        self.items = items
+
+    @property
+    def title(self):
+        return self.key.replace("_", " ").title()
+
+    @classmethod
+    def from_value(cls, key, value):
+        """
+        Build a Section from one entry of the converted content's "sections" mapping.
+        """
+        if key == "tables":
+            return cls(key, SECTION_TABLES, [Table.coerce(table) for table in value or []])
+        if isinstance(value, list):
+            return cls(key, SECTION_LIST, [_as_text(item) for item in value])
+        return cls(key, SECTION_TEXT, _as_text(value))
+
+    def to_value(self):
+        if self.kind == SECTION_TABLES:
+            return [table.rows for table in self.items]
+        return self.items
+
+    def to_data(self):
+        if self.kind == SECTION_TABLES:
+            return [self.key, self.kind, [table.to_data() for table in self.items]]
+        return [self.key, self.kind, self.items]
+
+    @classmethod
+    def from_data(cls, data):
+        key, kind, items = data
+        if kind == SECTION_TABLES:
+            items = [Table.from_data(table) for table in items]
+        return cls(key, kind, items)
+
+
+class StructuredDocument:
+    """
+    Structured content ready for rendering: an ordered list of Sections.
+    """
+    __slots__ = ("sections",)
+
+    def __init__(self, sections):
+        self.sections = sections
+
+    def get(self, key):
+        for section in self.sections:
+            if section.key == key:
+                return section
+        return None
+
+    @classmethod
+    def from_dict(cls, converted_content):
+        """
+        Build from the {"sections": {...}} dict returned by convert_content, or pass a StructuredDocument through.
+        """
+        if isinstance(converted_content, cls):
+            return converted_content
+        sections = (converted_content or {}).get("sections") or {}
+        return cls([Section.from_value(key, value) for key, value in sections.items()])
+
+    def to_dict(self):
+        return {"sections": {section.key: section.to_value() for section in self.sections}}
+
+    def to_data(self):
+        return [section.to_data() for section in self.sections]
+
+    @classmethod
+    def from_data(cls, data):
+        return cls([Section.from_data(item) for item in data])
+
+    def dumps(self):
+        return dumps(self.to_data())
+
+    @classmethod
+    def loads(cls, payload):
+        return cls.from_data(loads(payload))
+
+
+def dumps(data):
+    """
+    Encode IR data (from to_data) as compact UTF-8 JSON bytes.
+    """
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(payload):
+    return json.loads(payload)
@@ -0,0 +1,127 @@
+import os
+import time
+import logging
+from .metrics import increment
+
+logger = logging.getLogger(__name__)
+
+# Budgets for parsing and building one document; all configurable per deployment
+MAX_DECOMPRESSED_BYTES = int(float(os.environ.get('DOCX_MAX_DECOMPRESSED_MB', 200)) * 1024 * 1024)
+MAX_PARTS = int(os.environ.get('DOCX_MAX_PARTS', 2000))
+MAX_ELEMENTS = int(os.environ.get('DOCX_MAX_ELEMENTS', 1000000))
+MAX_TABLE_DEPTH = int(os.environ.get('DOCX_MAX_TABLE_DEPTH', 8))
+PARSE_TIMEOUT_S = float(os.environ.get('DOCX_PARSE_TIMEOUT_S', 20))
+BUILD_TIMEOUT_S = float(os.environ.get('DOCX_BUILD_TIMEOUT_S', 30))
+
+# Deadline.check yields to other greenlets every this many calls
+YIELD_EVERY = 256
+
+
+class DocumentTooComplex(Exception):
+    """
+    Raised when a document exceeds a parse or build budget.
+
+    Attributes:
+        reason (str): The budget exceeded: decompressed_size, part_count, element_count, nesting_depth or deadline.
+    """
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def limit_exceeded(reason, message):
+    """
+    Record a parse_limit_exceeded metric and return the DocumentTooComplex to raise.
+    """
+    increment("parse_limit_exceeded", reason=reason)
+    logger.warning(f"Document limit exceeded ({reason}): {message}")
+    return DocumentTooComplex(reason, message)
+
+
+class Deadline:
+    """
+    A wall-clock budget for one stage (parsing, matching, building), checked from inside its loops.
+
+    check() also sleeps for zero seconds every YIELD_EVERY calls. Under the gevent worker, time.sleep is
+    monkey-patched, so long CPU-bound loops give other greenlets on the worker a turn.
+    """
+
+    def __init__(self, seconds, stage):
+        self.seconds = seconds
+        self.stage = stage
+        self.expires_at = time.monotonic() + seconds
+        self._calls = 0
+
+    @classmethod
+    def for_parse(cls):
+        return cls(PARSE_TIMEOUT_S, "parsing")
+
+    @classmethod
+    def for_build(cls):
+        return cls(BUILD_TIMEOUT_S, "building")
+
+    def check(self):
+        self._calls += 1
+        if self._calls % YIELD_EVERY == 0:
+            time.sleep(0)
+        if time.monotonic() > self.expires_at:
+            raise limit_exceeded("deadline", f"{self.stage.capitalize()} took longer than {self.seconds:g} seconds")
+
+
+class ElementBudget:
+    """
+    Counts paragraphs, runs and table cells read from a document against MAX_ELEMENTS.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = MAX_ELEMENTS if limit is None else limit
+        self.count = 0
+
+    def add(self, count=1):
+        self.count += count
+        if self.count > self.limit:
+            raise limit_exceeded("element_count", f"The document has more than {self.limit} paragraphs, runs and table cells")
+
+
+def check_package(zf):
+    """
+    Check a .docx zip's part count and declared decompressed size before reading any part.
+    """
+    infos = zf.infolist()
+    if len(infos) > MAX_PARTS:
+        raise limit_exceeded("part_count", f"The document has {len(infos)} parts (limit {MAX_PARTS})")
+    total = sum(info.file_size for info in infos)
+    if total > MAX_DECOMPRESSED_BYTES:
+        raise limit_exceeded(
+            "decompressed_size",
+            f"The document expands to {total // (1024 * 1024)} MB (limit {MAX_DECOMPRESSED_BYTES // (1024 * 1024)} MB)"
+        )
+
+
+def check_table_depth(depth):
+    if depth > MAX_TABLE_DEPTH:
+        raise limit_exceeded("nesting_depth", f"Tables are nested more than {MAX_TABLE_DEPTH} levels deep")
+
+
+class LimitedReader:
+    """
+    Wrap a decompressing part stream and stop once more than max_bytes have been read.
+
+    Declared sizes in the zip directory can be forged, so the actual inflated size is enforced as well.
+    """
+
+    def __init__(self, stream, max_bytes=None):
+        self._stream = stream
+        self.max_bytes = MAX_DECOMPRESSED_BYTES if max_bytes is None else max_bytes
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise limit_exceeded(
+                "decompressed_size",
+                f"The document body expands beyond {self.max_bytes // (1024 * 1024)} MB"
+            )
+        return data
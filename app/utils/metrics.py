@@ -0,0 +1,72 @@
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_collectors = {}
+_started_at = time.time()
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={labels[k]}" for k in sorted(labels)) + "}"
+
+
+def increment(name, value=1, **labels):
+    """
+    Increment a counter.
+
+    Args:
+        name (str): The counter name.
+        value (int or float): The amount to add.
+        **labels: Optional labels, folded into the counter key (e.g. reason='depth').
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """
+    Set a gauge to its current value.
+    """
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register_collector(name, collector):
+    """
+    Register a callable whose return value is included in snapshots under ``name``.
+
+    Used for components that expose structured state, such as the fan-out controller.
+    """
+    with _lock:
+        _collectors[name] = collector
+
+
+def snapshot():
+    """
+    Return the current counters, gauges and collector state.
+
+    Returns:
+        dict: JSON-serialisable metrics.
+    """
+    with _lock:
+        data = {
+            "uptime_seconds": round(time.time() - _started_at, 1),
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+        }
+        collectors = dict(_collectors)
+    for name, collector in collectors.items():
+        try:
+            data[name] = collector()
+        except Exception as e:
+            logger.error(f"Metrics collector '{name}' failed: {str(e)}")
+            data[name] = {"error": str(e)}
+    return data
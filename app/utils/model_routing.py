@@ -0,0 +1,88 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Ordered smallest to largest; any OpenAI-compatible model names can be configured
+CONVERSION_MODELS = [
+    name.strip() for name in os.environ.get('CONVERSION_MODELS', 'gpt-4o-mini,gpt-4o').split(',') if name.strip()
+]
+# Inputs above this many tokens, or templates with more sections, skip the smallest model
+ROUTING_SMALL_INPUT_TOKENS = int(os.environ.get('ROUTING_SMALL_INPUT_TOKENS', 2500))
+ROUTING_SMALL_SECTION_COUNT = int(os.environ.get('ROUTING_SMALL_SECTION_COUNT', 8))
+# Templates whose small-model success rate drops below this are routed to the larger model
+ROUTING_MIN_SUCCESS_RATE = float(os.environ.get('ROUTING_MIN_SUCCESS_RATE', 0.8))
+ROUTING_MIN_HISTORY = int(os.environ.get('ROUTING_MIN_HISTORY', 5))
+
+_history = {}
+_history_lock = threading.Lock()
+
+
+def record_outcome(template_key, model, success):
+    """
+    Record whether a model returned usable output for a template.
+
+    Args:
+        template_key: Identifies the template (ID or prompt hash); None is ignored.
+        model (str): The model name used.
+        success (bool): True if the response parsed as valid JSON.
+    """
+    if template_key is None:
+        return
+    with _history_lock:
+        stats = _history.setdefault((template_key, model), [0, 0])
+        stats[0] += 1
+        stats[1] += 1 if success else 0
+
+
+def success_rate(template_key, model):
+    """
+    Return the observed success rate of a model for a template, or None without enough history.
+    """
+    with _history_lock:
+        attempts, successes = _history.get((template_key, model), (0, 0))
+    if attempts < ROUTING_MIN_HISTORY:
+        return None
+    return successes / attempts
+
+
+def choose_model(estimated_tokens, expected_sections=0, template_key=None, models=None):
+    """
+    Pick the smallest configured model suited to a conversion.
+
+    Args:
+        estimated_tokens (int): Estimated input tokens of the request.
+        expected_sections (int): Number of sections the template expects.
+        template_key: Identifies the template for per-template success history.
+        models (list, optional): Model names ordered smallest to largest. Defaults to CONVERSION_MODELS.
+
+    Returns:
+        str: The model name to try first.
+    """
+    models = models or CONVERSION_MODELS
+    if len(models) == 1:
+        return models[0]
+    tier = 0
+    if estimated_tokens > ROUTING_SMALL_INPUT_TOKENS or expected_sections > ROUTING_SMALL_SECTION_COUNT:
+        tier = len(models) - 1
+    # Skip tiers that keep failing for this template
+    while tier < len(models) - 1:
+        rate = success_rate(template_key, models[tier])
+        if rate is None or rate >= ROUTING_MIN_SUCCESS_RATE:
+            break
+        tier += 1
+    logger.debug(
+        f"Routing {estimated_tokens} tokens / {expected_sections} sections (template {template_key}) to {models[tier]}"
+    )
+    return models[tier]
+
+
+def escalation_chain(model, models=None):
+    """
+    Return the model followed by every larger configured model, for retries on invalid output.
+    """
+    models = models or CONVERSION_MODELS
+    if model not in models:
+        return [model]
+    return models[models.index(model):]
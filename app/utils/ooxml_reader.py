@@ -0,0 +1,330 @@
+import zipfile
+import logging
+import posixpath
+from lxml import etree
+from .ir import Run, Paragraph, Table
+from .limits import Deadline, ElementBudget, LimitedReader, check_package, check_table_depth
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the blocks produced by iter_blocks change, so cached parse results are invalidated
+PARSER_VERSION = "2"
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+STYLES_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+
+
+def w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+
+W_BODY = w("body")
+W_P = w("p")
+W_TBL = w("tbl")
+W_TR = w("tr")
+W_TC = w("tc")
+W_R = w("r")
+W_T = w("t")
+W_TAB = w("tab")
+W_BR = w("br")
+W_CR = w("cr")
+W_HYPERLINK = w("hyperlink")
+W_TRPR = w("trPr")
+W_TCPR = w("tcPr")
+W_GRID_BEFORE = w("gridBefore")
+W_GRID_AFTER = w("gridAfter")
+W_GRID_SPAN = w("gridSpan")
+W_VMERGE = w("vMerge")
+W_VAL = w("val")
+_TRUE_VALUES = ("1", "true", "on")
+
+
+def _part_rels(zf, part_name):
+    """
+    Return {type: target part name} for the relationships of a package part ('' for the package).
+    """
+    directory, name = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, "_rels", f"{name}.rels")
+    try:
+        root = etree.fromstring(zf.read(rels_name))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        rels.setdefault(rel.get("Type"), posixpath.normpath(posixpath.join(directory, rel.get("Target"))).lstrip("/"))
+    return rels
+
+
+def document_part_name(zf):
+    """
+    Resolve the main document part of a .docx package (normally word/document.xml).
+    """
+    return _part_rels(zf, "").get(OFFICE_DOCUMENT_REL, "word/document.xml")
+
+
+def _on_off(element):
+    """
+    Interpret a w:b-style toggle element: absent -> None, present -> its boolean value.
+    """
+    if element is None:
+        return None
+    return element.get(W_VAL, "true").lower() in _TRUE_VALUES
+
+
+def _run_properties(rpr):
+    """
+    Read the basic formatting of a w:rPr element into a compact dict.
+    """
+    props = {"bold": None, "italic": None, "size_pt": None, "font_name": None, "color_rgb": None}
+    if rpr is None:
+        return props
+    props["bold"] = _on_off(rpr.find(w("b")))
+    props["italic"] = _on_off(rpr.find(w("i")))
+    size = rpr.find(w("sz"))
+    if size is not None and size.get(W_VAL, "").isdigit():
+        props["size_pt"] = int(size.get(W_VAL)) / 2
+    fonts = rpr.find(w("rFonts"))
+    if fonts is not None:
+        props["font_name"] = fonts.get(w("ascii")) or fonts.get(w("hAnsi"))
+    color = rpr.find(w("color"))
+    if color is not None and len(color.get(W_VAL, "")) == 6 and color.get(W_VAL) != "auto":
+        value = color.get(W_VAL)
+        props["color_rgb"] = [int(value[i:i + 2], 16) for i in (0, 2, 4)]
+    return props
+
+
+def read_styles(file):
+    """
+    Read paragraph and character styles from styles.xml, resolving basedOn inheritance.
+
+    Args:
+        file: A path, file-like object or open ZipFile of the .docx package.
+
+    Returns:
+        dict: styleId -> {"name", "type", "bold", "italic", "size_pt", "font_name", "color_rgb"}.
+    """
+    zf = file if isinstance(file, zipfile.ZipFile) else zipfile.ZipFile(file)
+    styles_part = _part_rels(zf, document_part_name(zf)).get(STYLES_REL, "word/styles.xml")
+    try:
+        root = etree.fromstring(zf.read(styles_part))
+    except KeyError:
+        return {}
+
+    raw = {}
+    for style in root.iter(w("style")):
+        style_id = style.get(w("styleId"))
+        if not style_id:
+            continue
+        name = style.find(w("name"))
+        based_on = style.find(w("basedOn"))
+        props = _run_properties(style.find(w("rPr")))
+        props["name"] = name.get(W_VAL) if name is not None else style_id
+        props["type"] = style.get(w("type"))
+        props["based_on"] = based_on.get(W_VAL) if based_on is not None else None
+        raw[style_id] = props
+
+    resolved = {}
+
+    def resolve(style_id, seen=()):
+        if style_id in resolved:
+            return resolved[style_id]
+        props = dict(raw[style_id])
+        parent_id = props.pop("based_on")
+        if parent_id in raw and parent_id not in seen:
+            parent = resolve(parent_id, seen + (style_id,))
+            for key, value in parent.items():
+                if props.get(key) is None and key not in ("name", "type"):
+                    props[key] = value
+        resolved[style_id] = props
+        return props
+
+    for style_id in raw:
+        resolve(style_id)
+    return resolved
+
+
+def _iter_runs(paragraph):
+    # Direct runs and runs inside hyperlinks, as python-docx's Paragraph.text does
+    for child in paragraph:
+        if child.tag == W_R:
+            yield child
+        elif child.tag == W_HYPERLINK:
+            for run in child:
+                if run.tag == W_R:
+                    yield run
+
+
+def _run_text(run):
+    parts = []
+    for child in run:
+        if child.tag == W_T:
+            parts.append(child.text or "")
+        elif child.tag == W_TAB:
+            parts.append("\t")
+        elif child.tag in (W_BR, W_CR):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def read_paragraph(paragraph, styles=None, with_runs=True):
+    """
+    Convert a w:p element into a Paragraph.
+
+    Args:
+        paragraph: The w:p lxml element.
+        styles (dict, optional): Resolved styles from read_styles; run formatting left unset on the run
+            is inherited from the paragraph style when given.
+        with_runs (bool): Include per-run text and formatting.
+
+    Returns:
+        Paragraph: The paragraph text, style ID and runs.
+    """
+    ppr = paragraph.find(w("pPr"))
+    style_element = ppr.find(w("pStyle")) if ppr is not None else None
+    style_id = style_element.get(W_VAL) if style_element is not None else None
+    inherited = (styles or {}).get(style_id) if styles else None
+
+    texts = []
+    runs = []
+    for run in _iter_runs(paragraph):
+        text = _run_text(run)
+        texts.append(text)
+        if with_runs and text:
+            props = _run_properties(run.find(w("rPr")))
+            if inherited:
+                for key, value in props.items():
+                    if value is None:
+                        props[key] = inherited.get(key)
+            runs.append(Run(text, **props))
+    return Paragraph("".join(texts), style_id, tuple(runs))
+
+
+def _int_val(element, default):
+    if element is None:
+        return default
+    value = element.get(W_VAL, "")
+    return int(value) if value.isdigit() else default
+
+
+def read_table(table, budget=None):
+    """
+    Convert a w:tbl element into a dense row-major Table with merge metadata, in one pass.
+
+    Cells are read directly from w:tc, with w:gridSpan for horizontal and w:vMerge for vertical
+    merges (and w:gridBefore/w:gridAfter for skipped grid columns). Text is kept at the top-left cell
+    of each merged region and covered grid positions are blank, so merged text is never repeated.
+
+    Args:
+        table: The w:tbl lxml element.
+        budget (ElementBudget, optional): Charged one element per grid cell, so oversized spans fail fast.
+
+    Returns:
+        Table: Rows padded to the full grid width; merges as [row, col, row_span, col_span].
+    """
+    budget = budget or ElementBudget()
+    rows = []
+    merges = []
+    # Grid column -> index into merges of the vertical merge open in that column
+    open_vertical = {}
+    for row_idx, row in enumerate(table.iterchildren(W_TR)):
+        cells = []
+        trpr = row.find(W_TRPR)
+        if trpr is not None:
+            skipped = _int_val(trpr.find(W_GRID_BEFORE), 0)
+            budget.add(skipped)
+            cells.extend([""] * skipped)
+        for cell in row.iterchildren(W_TC):
+            col_idx = len(cells)
+            tcpr = cell.find(W_TCPR)
+            span = _int_val(tcpr.find(W_GRID_SPAN), 1) if tcpr is not None else 1
+            vmerge = tcpr.find(W_VMERGE) if tcpr is not None else None
+            continues = vmerge is not None and vmerge.get(W_VAL, "continue") == "continue"
+            budget.add(span)
+
+            if continues and col_idx in open_vertical:
+                merges[open_vertical[col_idx]][2] += 1
+                cells.extend([""] * span)
+                continue
+
+            text = "\n".join(
+                "".join(_run_text(run) for run in _iter_runs(p)) for p in cell.iterchildren(W_P)
+            ).strip()
+            cells.append(text)
+            cells.extend([""] * (span - 1))
+            for covered in range(col_idx, col_idx + span):
+                open_vertical.pop(covered, None)
+            if vmerge is not None or span > 1:
+                merges.append([row_idx, col_idx, 1, span])
+                if vmerge is not None:
+                    open_vertical[col_idx] = len(merges) - 1
+        if trpr is not None:
+            skipped = _int_val(trpr.find(W_GRID_AFTER), 0)
+            budget.add(skipped)
+            cells.extend([""] * skipped)
+        # Columns this row did not reach end any vertical merge in them
+        for col_idx in [col for col in open_vertical if col >= len(cells)]:
+            del open_vertical[col_idx]
+        rows.append(cells)
+
+    width = max((len(cells) for cells in rows), default=0)
+    budget.add(sum(width - len(cells) for cells in rows))
+    for cells in rows:
+        cells.extend([""] * (width - len(cells)))
+    return Table(rows, [merge for merge in merges if merge[2] > 1 or merge[3] > 1])
+
+
+def iter_blocks(file, resolve_styles=False, with_runs=True, deadline=None, budget=None):
+    """
+    Stream the top-level paragraphs and tables of a .docx without building the python-docx object tree.
+
+    Only the main document part is parsed (plus styles.xml when resolve_styles is set), with
+    lxml.iterparse; each body-level element is converted and then cleared, so memory stays proportional
+    to the largest paragraph or table rather than to the document.
+
+    The package's part count and decompressed size, the element count, table nesting depth and
+    wall-clock time are all budgeted (see limits); exceeding any of them raises DocumentTooComplex.
+
+    Args:
+        file: A path or seekable file-like object of the .docx package.
+        resolve_styles (bool): Inherit unset run formatting from paragraph styles.
+        with_runs (bool): Include per-run formatting on paragraphs.
+        deadline (Deadline, optional): Wall-clock budget; defaults to Deadline.for_parse().
+        budget (ElementBudget, optional): Element budget; defaults to MAX_ELEMENTS.
+
+    Yields:
+        Paragraph or Table: IR blocks in document order.
+    """
+    deadline = deadline or Deadline.for_parse()
+    budget = budget or ElementBudget()
+    with zipfile.ZipFile(file) as zf:
+        check_package(zf)
+        styles = read_styles(zf) if resolve_styles else None
+        with zf.open(document_part_name(zf)) as stream:
+            table_depth = 0
+            for event, element in etree.iterparse(LimitedReader(stream), events=("start", "end"), tag=(W_P, W_TBL), huge_tree=True):
+                deadline.check()
+                if element.tag == W_TBL:
+                    if event == "start":
+                        table_depth += 1
+                        check_table_depth(table_depth)
+                        continue
+                    table_depth -= 1
+                if event == "start" or table_depth:
+                    continue
+                parent = element.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    continue
+                if element.tag == W_TBL:
+                    yield read_table(element, budget)
+                else:
+                    paragraph = read_paragraph(element, styles, with_runs)
+                    budget.add(1 + len(paragraph.runs))
+                    yield paragraph
+                # Free the processed element and everything before it
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
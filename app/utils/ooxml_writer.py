@@ -0,0 +1,179 @@
+from copy import deepcopy
+from io import BytesIO
+from xml.sax.saxutils import escape
+from docx.opc.pkgwriter import PackageWriter
+from lxml import etree
+import os
+import re
+import uuid
+import logging
+from .style_compiler import W_R
+
+logger = logging.getLogger(__name__)
+
+# Outputs with at least this many paragraphs and table cells are written by OoxmlWriter
+DIRECT_WRITER_THRESHOLD = int(os.environ.get('DIRECT_WRITER_THRESHOLD', 2000))
+
+# The characters CT_R.text turns into w:tab and w:br elements
+_RUN_BREAKS = re.compile(r'([\t\r\n])')
+# Characters lxml refuses in text nodes
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_SENTINEL = "OOXML-WRITER-TEXT"
+
+
+def _serialize(element):
+    """
+    Serialize an element of document.xml as it appears inside the document, without namespace declarations.
+
+    lxml declares the element's in-scope namespaces on its start tag, which the document root already
+    declares; only those declarations are removed. The start tag ends at the first '>', since lxml escapes
+    '>' in attribute values.
+    """
+    markup = etree.tostring(element, encoding='unicode')
+    end = markup.index('>')
+    start_tag = markup[:end]
+    for prefix, uri in element.nsmap.items():
+        start_tag = start_tag.replace(f' xmlns:{prefix}="{uri}"' if prefix else f' xmlns="{uri}"', '', 1)
+    return start_tag + markup[end:]
+
+
+def _run_content(text):
+    """
+    Return the w:t/w:tab/w:br markup ``run.text = text`` produces.
+    """
+    if _INVALID_XML.search(text):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    parts = []
+    for piece in _RUN_BREAKS.split(text):
+        if not piece:
+            continue
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in '\r\n':
+            parts.append('<w:br/>')
+        elif len(piece.strip()) < len(piece):
+            parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+        else:
+            parts.append(f'<w:t>{escape(piece)}</w:t>')
+    return ''.join(parts)
+
+
+class _FragmentMarkup:
+    """
+    A compiled w:p fragment as strings: the markup around the run text, and the empty forms.
+    """
+
+    __slots__ = ("prefix", "suffix", "empty_run", "no_run")
+
+    def __init__(self, fragment):
+        with_text = deepcopy(fragment)
+        with_text.find(W_R).text = _SENTINEL
+        self.prefix, self.suffix = _serialize(with_text).split(f'<w:t>{_SENTINEL}</w:t>')
+        self.empty_run = _serialize(fragment)
+        without_run = deepcopy(fragment)
+        without_run.remove(without_run.find(W_R))
+        self.no_run = _serialize(without_run)
+
+    def render(self, text, keep_empty_run=False):
+        if text:
+            return self.prefix + _run_content(text) + self.suffix
+        return self.empty_run if keep_empty_run else self.no_run
+
+
+class _SerializedPart:
+    """
+    Stands in for a package part whose XML has already been serialized, for PackageWriter.
+    """
+
+    def __init__(self, part, blob):
+        self.partname = part.partname
+        self.content_type = part.content_type
+        self.rels = part.rels
+        self.blob = blob
+
+
+class OoxmlWriter:
+    """
+    Write the document body as markup strings instead of python-docx objects, for large outputs.
+
+    Has the add_paragraph/add_table interface of StyleCompiler and produces the same document.xml: each
+    compiled fragment is serialized once and reused as a string template, and tables are emitted row by
+    row. Styles (including named-mode styles), the section properties and every other part come from the
+    compiler's document, so only word/document.xml is generated here.
+    """
+
+    def __init__(self, compiler):
+        self.compiler = compiler
+        self.doc = compiler.doc
+        self._parts = []
+        self._markup = {}
+
+    def _fragment_markup(self, fmt, paragraph_style=None, role="body"):
+        fragment = self.compiler.fragment(fmt, paragraph_style, role)
+        markup = self._markup.get(fragment)
+        if markup is None:
+            markup = self._markup[fragment] = _FragmentMarkup(fragment)
+        return markup
+
+    def add_paragraph(self, text, fmt, paragraph_style=None, role="body"):
+        self._parts.append(self._fragment_markup(fmt, paragraph_style, role).render(text))
+
+    def add_table(self, table_data, fmt, deadline=None):
+        if table_data.merges:
+            # Merging moves cell content around; leave that to python-docx and serialize the result
+            table = self.compiler.add_table(table_data, fmt, deadline)
+            self._parts.append(_serialize(table._tbl))
+            table._tbl.getparent().remove(table._tbl)
+            return
+
+        # A one-row table from python-docx supplies tblPr, tblGrid and the cell properties
+        column_count = table_data.column_count or 1
+        table = self.doc.add_table(rows=1, cols=column_count)
+        tbl = table._tbl
+        tbl.getparent().remove(tbl)
+        tc = tbl.tr_lst[0].tc_lst[0]
+        tc.clear_content()
+        tbl_markup = _serialize(tbl)
+        head = tbl_markup[:tbl_markup.index('<w:tr>')]
+        cell_open = _serialize(tc)[:-len('</w:tc>')]
+
+        markup = self._fragment_markup(fmt, role="table")
+        parts = [head]
+        for row in table_data.rows:
+            if deadline is not None:
+                deadline.check()
+            cells = [cell_open + markup.render(cell_text, keep_empty_run=True) + '</w:tc>'
+                     for cell_text in row[:column_count]]
+            # Ragged rows get empty cells, as python-docx's table would have
+            cells.extend(cell_open + '<w:p/></w:tc>' for _ in range(column_count - len(row)))
+            parts.append('<w:tr>' + ''.join(cells) + '</w:tr>')
+        parts.append('</w:tbl>')
+        self._parts.append(''.join(parts))
+
+    def _document_xml(self):
+        # Serialize the document around a marker placed where python-docx inserts new blocks
+        marker = etree.Comment(uuid.uuid4().hex)
+        self.doc.element.body._insert_p(marker)
+        try:
+            serialized = etree.tostring(self.doc.element, encoding='UTF-8', standalone=True).decode('utf-8')
+        finally:
+            marker.getparent().remove(marker)
+        marker_markup = f'<!--{marker.text}-->'
+        start = serialized.index(marker_markup)
+        end = start + len(marker_markup)
+        return (serialized[:start] + ''.join(self._parts) + serialized[end:]).encode('utf-8')
+
+    def save(self):
+        """
+        Return the finished .docx package as bytes.
+        """
+        document_part = self.doc.part
+        package = document_part.package
+        # As Document.save, but the document part is written from the markup built here, so the package is
+        # serialized and zipped once
+        for part in package.parts:
+            part.before_marshal()
+        parts = [_SerializedPart(part, self._document_xml()) if part is document_part else part for part in package.parts]
+        output = BytesIO()
+        PackageWriter.write(output, package.rels, parts)
+        return output.getvalue()
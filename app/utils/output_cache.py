@@ -0,0 +1,68 @@
+import hashlib
+import json
+import logging
+from .cache import TieredCache
+from .docx_builder import create_reformatted_docx, BUILDER_VERSION
+from .ir import StructuredDocument
+from .metrics import increment
+from .style_compiler import DEFAULT_STYLE_MODE
+
+logger = logging.getLogger(__name__)
+
+# Rendered .docx outputs keyed by render_key; OUTPUT_CACHE_DIR enables the on-disk tier, bounded by OUTPUT_CACHE_DIR_MAX_MB
+output_cache = TieredCache.from_env('OUTPUT_CACHE', maxsize=64, max_bytes=128 * 1024 * 1024)
+
+
+def render_key(user_id, structured, artifacts, section_styles=None, style_mode=None):
+    """
+    Return the cache key of an output: the user plus a hash of everything the rendered bytes depend on.
+
+    The user prefix keeps outputs private to the user who created them; the rest is a hex digest, so keys
+    are safe as file names and URLs.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        BUILDER_VERSION,
+        artifacts["version"],
+        artifacts["template_hash"],
+        style_mode or DEFAULT_STYLE_MODE,
+        json.dumps(section_styles or {}, sort_keys=True),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(structured.dumps())
+    return f"{user_id}-{digest.hexdigest()}"
+
+
+def key_owner(key):
+    """
+    Return the user id (as a string) a render_key belongs to, or None for a malformed key.
+    """
+    owner, _, digest = key.partition("-")
+    if not owner or len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+        return None
+    return owner
+
+
+def render_cached(user_id, converted_content, artifacts, section_styles=None, style_mode=None, deadline=None):
+    """
+    Render structured content against a template's artifacts, reusing the bytes of an identical earlier render.
+
+    deadline is passed to create_reformatted_docx (default Deadline.for_build()).
+
+    Returns:
+        tuple: (key, bytes) - the render_key (also usable as an ETag) and the .docx file.
+    """
+    structured = StructuredDocument.from_dict(converted_content)
+    key = render_key(user_id, structured, artifacts, section_styles, style_mode)
+    output_file = output_cache.get(key)
+    if output_file is not None:
+        increment("output_cache", result="hit")
+        return key, output_file
+    increment("output_cache", result="miss")
+    output_file = create_reformatted_docx(
+        structured, section_styles=section_styles, style_profile=artifacts["style_profile"],
+        skeleton=artifacts["skeleton"], style_mode=style_mode, deadline=deadline
+    )
+    output_cache.set(key, output_file)
+    return key, output_file
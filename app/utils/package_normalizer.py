@@ -0,0 +1,272 @@
+import os
+import zlib
+import struct
+import hashlib
+import zipfile
+import logging
+import posixpath
+from io import BytesIO
+from lxml import etree
+from .limits import DocumentTooComplex, check_package
+from .metrics import increment
+
+logger = logging.getLogger(__name__)
+
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+FONT_REL_SUFFIX = "/relationships/font"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "bmp", "tif", "tiff", "emf", "wmf", "wdp", "svg"}
+EMBEDDED_FONT_TAGS = {f"{{{W_NS}}}{tag}" for tag in ("embedRegular", "embedBold", "embedItalic", "embedBoldItalic")}
+
+# Replace template body images with a placeholder (TEMPLATE_STRIP_MEDIA=1). Images used by headers and footers
+# are kept, since outputs are built into the template's package and carry its headers and footers
+TEMPLATE_STRIP_MEDIA = os.environ.get('TEMPLATE_STRIP_MEDIA', '0') == '1'
+
+
+def _placeholder_png():
+    # A 1x1 white PNG, built here rather than shipped as a binary blob
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff")) + chunk(b"IEND", b"")
+
+
+PLACEHOLDER_PNG = _placeholder_png()
+
+
+def _rels_source(rels_name):
+    """
+    Return the part a .rels file describes ('' for the package relationships).
+    """
+    directory, name = posixpath.split(rels_name)
+    return posixpath.join(posixpath.dirname(directory), name[:-len(".rels")])
+
+
+def _rels_name(part_name):
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+
+def _resolve(source, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+
+
+def _is_binary(part_name):
+    return not part_name.endswith((".xml", ".rels")) and part_name != CONTENT_TYPES_PART
+
+
+def _is_header_or_footer(part_name):
+    return posixpath.basename(part_name).startswith(("header", "footer"))
+
+
+def inspect_package(file):
+    """
+    Summarise a .docx package from its zip directory, without decompressing any part.
+
+    Returns:
+        dict: bytes, part_count, media_bytes, font_bytes and custom_xml_bytes (uncompressed sizes).
+    """
+    with zipfile.ZipFile(file) as zf:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+    report = {"bytes": sum(info.file_size for info in infos), "part_count": len(infos),
+              "media_bytes": 0, "font_bytes": 0, "custom_xml_bytes": 0}
+    for info in infos:
+        if info.filename.startswith("customXml/"):
+            report["custom_xml_bytes"] += info.file_size
+        elif "/fonts/" in info.filename:
+            report["font_bytes"] += info.file_size
+        elif info.filename.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS:
+            report["media_bytes"] += info.file_size
+    return report
+
+
+def normalize_package(data, strip_media=False):
+    """
+    Rewrite a .docx package without the parts the text pipeline never uses.
+
+    - customXml parts and their relationships are dropped.
+    - Byte-identical binary parts (typically repeated images) are stored once and relationships retargeted.
+    - Parts no relationship reaches (orphaned media, etc.) are dropped.
+    - With strip_media, images are replaced by a 1x1 placeholder and embedded fonts are removed. Images
+      referenced by headers and footers are kept, as outputs show them.
+
+    The package's part count and uncompressed size are checked (limits.check_package) before any part is
+    inflated.
+
+    Args:
+        data (bytes): The .docx file.
+        strip_media (bool): Replace images and drop embedded fonts as well.
+
+    Returns:
+        tuple: (normalized bytes, report dict with bytes_before, bytes_after, removed parts and counts).
+
+    Raises:
+        DocumentTooComplex: If the package exceeds the part count or decompressed size budget.
+    """
+    with zipfile.ZipFile(BytesIO(data)) as zin:
+        check_package(zin)
+        order = [info.filename for info in zin.infolist() if not info.is_dir()]
+        parts = {name: zin.read(name) for name in order}
+
+    removed = {}
+    report = {"bytes_before": len(data), "removed": [], "deduplicated": 0, "placeholders": 0, "fonts_removed": 0}
+    rels = {name: etree.fromstring(parts[name]) for name in order if name.endswith(".rels")}
+    content_types = etree.fromstring(parts[CONTENT_TYPES_PART])
+
+    def relationships():
+        for rels_name, root in rels.items():
+            source = _rels_source(rels_name)
+            for rel in list(root):
+                if rel.get("TargetMode") != "External":
+                    yield rels_name, source, rel
+
+    # customXml is never read by Word's text layout or by us
+    for rels_name, source, rel in list(relationships()):
+        if _resolve(source, rel.get("Target")).startswith("customXml/"):
+            rels[rels_name].remove(rel)
+
+    if strip_media:
+        font_table = "word/fontTable.xml"
+        if font_table in parts:
+            root = etree.fromstring(parts[font_table])
+            embeds = [element for element in root.iter() if element.tag in EMBEDDED_FONT_TAGS]
+            for element in embeds:
+                element.getparent().remove(element)
+            report["fonts_removed"] = len(embeds)
+            parts[font_table] = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+        for rels_name, source, rel in list(relationships()):
+            if rel.get("Type", "").endswith(FONT_REL_SUFFIX):
+                rels[rels_name].remove(rel)
+        header_media = {
+            _resolve(source, rel.get("Target")) for _, source, rel in relationships() if _is_header_or_footer(source)
+        }
+        overrides = {override.get("PartName", "").lstrip("/"): override
+                     for override in content_types.iter(f"{{{CT_NS}}}Override")}
+        for name in order:
+            if (name.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS and name not in header_media
+                    and parts[name] != PLACEHOLDER_PNG):
+                removed[name] = (len(parts[name]) - len(PLACEHOLDER_PNG), "media")
+                parts[name] = PLACEHOLDER_PNG
+                override = overrides.get(name)
+                if override is None:
+                    override = etree.SubElement(content_types, f"{{{CT_NS}}}Override")
+                    override.set("PartName", f"/{name}")
+                override.set("ContentType", "image/png")
+                report["placeholders"] += 1
+
+    # Store identical binary parts once
+    canonical = {}
+    duplicate_of = {}
+    for name in order:
+        if _is_binary(name):
+            digest = hashlib.sha256(parts[name]).digest()
+            if digest in canonical:
+                duplicate_of[name] = canonical[digest]
+            else:
+                canonical[digest] = name
+    for rels_name, source, rel in relationships():
+        target = _resolve(source, rel.get("Target"))
+        if target in duplicate_of:
+            rel.set("Target", posixpath.relpath(duplicate_of[target], posixpath.dirname(source) or "."))
+    report["deduplicated"] = len(duplicate_of)
+
+    # Keep only parts reachable from the package relationships
+    reachable = set()
+    pending = [""]
+    while pending:
+        source = pending.pop()
+        root = rels.get(_rels_name(source))
+        if root is None:
+            continue
+        for rel in root:
+            if rel.get("TargetMode") == "External":
+                continue
+            target = _resolve(source, rel.get("Target"))
+            if target in parts and target not in reachable:
+                reachable.add(target)
+                pending.append(target)
+
+    kept = []
+    for name in order:
+        is_rels = name.endswith(".rels")
+        keep = (
+            name == CONTENT_TYPES_PART or
+            (is_rels and (_rels_source(name) in reachable or _rels_source(name) == "")) or
+            (not is_rels and name in reachable)
+        )
+        if keep:
+            kept.append(name)
+        else:
+            reason = "duplicate" if name in duplicate_of else "custom_xml" if name.startswith("customXml/") else "unreferenced"
+            removed[name] = (len(parts[name]), reason)
+
+    kept_set = set(kept)
+    for override in list(content_types.iter(f"{{{CT_NS}}}Override")):
+        if override.get("PartName", "").lstrip("/") not in kept_set:
+            content_types.remove(override)
+
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zout:
+        for name in kept:
+            if name == CONTENT_TYPES_PART:
+                content = etree.tostring(content_types, xml_declaration=True, encoding="UTF-8", standalone=True)
+            elif name in rels:
+                content = etree.tostring(rels[name], xml_declaration=True, encoding="UTF-8", standalone=True)
+            else:
+                content = parts[name]
+            zout.writestr(name, content)
+    result = output.getvalue()
+
+    report["removed"] = [{"part": name, "bytes": size, "reason": reason} for name, (size, reason) in removed.items()]
+    report["bytes_after"] = len(result)
+    return result, report
+
+
+def normalize_template_file(data, template_name=""):
+    """
+    Normalize a template upload before it is stored, logging and counting what was removed.
+
+    Falls back to the original bytes if the package cannot be normalized, without inflating it if it is over
+    the package budget.
+
+    Returns:
+        tuple: (bytes to store, report dict or None).
+    """
+    try:
+        normalized, report = normalize_package(data, strip_media=TEMPLATE_STRIP_MEDIA)
+    except DocumentTooComplex as e:
+        logger.warning(f"Template '{template_name}' is over the package budget, storing it unchanged: {str(e)}")
+        return data, None
+    except Exception as e:
+        logger.warning(f"Could not normalize template '{template_name}', storing it unchanged: {str(e)}")
+        return data, None
+    increment("package_bytes_removed", report["bytes_before"] - report["bytes_after"], kind="template")
+    increment("package_parts_removed", len(report["removed"]), kind="template")
+    logger.info(
+        f"Normalized template '{template_name}': {report['bytes_before']} -> {report['bytes_after']} bytes, "
+        f"{len(report['removed'])} parts removed, {report['deduplicated']} duplicates"
+    )
+    return normalized, report
+
+
+def record_source_package(file, filename=""):
+    """
+    Log and count the media carried by a source upload.
+
+    Sources are not rewritten: the streaming reader only inflates the document and styles parts, so
+    embedded media never costs parse time. Only the zip directory is read here.
+    """
+    try:
+        report = inspect_package(file)
+    except zipfile.BadZipFile:
+        return None
+    finally:
+        file.seek(0)
+    skipped = report["media_bytes"] + report["font_bytes"] + report["custom_xml_bytes"]
+    increment("package_bytes_skipped", skipped, kind="source")
+    logger.info(f"Source '{filename}': {report['bytes']} bytes in {report['part_count']} parts, {skipped} bytes of media/fonts/customXml not parsed")
+    return report
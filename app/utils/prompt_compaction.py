@@ -0,0 +1,129 @@
+import re
+import logging
+from .serialization import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_SECTION_RE = re.compile(r"^\*\*Section:\s*([^\*]+)\*\*\s*$")
+_STYLE_HEADER_RE = re.compile(r"^-\s*\*\*Style\*\*:\s*$")
+_STYLE_LINE_RE = re.compile(r"^\s+-\s*([A-Za-z ]+):\s*(.*?)\s*$")
+_RGB_RE = re.compile(r"RGB\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)", re.IGNORECASE)
+_POINTS_RE = re.compile(r"^(-?\d+(?:\.\d+)?)\s*pt$", re.IGNORECASE)
+
+
+def _parse_bool(value):
+    return value.strip().lower() in ("true", "yes", "1")
+
+
+def _parse_points(value):
+    match = _POINTS_RE.match(value.strip())
+    return float(match.group(1)) if match else None
+
+
+def _parse_rgb(value):
+    match = _RGB_RE.search(value)
+    return [int(match.group(i)) for i in range(1, 4)] if match else None
+
+
+# Style lines written by template.create_prompt_from_file, mapped to create_reformatted_docx keys
+STYLE_FIELDS = {
+    "font": ("font_name", str.strip),
+    "size": ("font_size_pt", _parse_points),
+    "bold": ("bold", _parse_bool),
+    "color": ("color_rgb", _parse_rgb),
+    "alignment": ("alignment", lambda value: value.strip().lower()),
+    "spacing before": ("spacing_before_pt", _parse_points),
+    "spacing after": ("spacing_after_pt", _parse_points),
+    "horizontal list": ("is_horizontal_list", _parse_bool),
+}
+
+
+def section_key_for(header):
+    """
+    Derive the structured-content key for a section header, as used in the template prompt.
+
+    Args:
+        header (str): The section header text.
+
+    Returns:
+        str: The section key (e.g. 'professional_experience').
+    """
+    return header.strip().lower().replace(' ', '_')
+
+
+def compact_template_prompt(template_prompt):
+    """
+    Split a template prompt into the structural part sent to the LLM and per-section style metadata.
+
+    Section names, purposes, order and placeholders are kept in the prompt; the Font, Size, Bold,
+    Color, Alignment, Spacing and Horizontal List lines are removed and returned separately so they
+    can go straight to the docx builder.
+
+    Args:
+        template_prompt (str): The template prompt, typically generated by create_prompt_from_file.
+
+    Returns:
+        tuple: (compact_prompt (str), section_styles (dict)) where section_styles maps section keys
+            to builder style dicts.
+    """
+    if not template_prompt:
+        return template_prompt, {}
+
+    lines = []
+    section_styles = {}
+    current_key = None
+    in_style_block = False
+    for line in template_prompt.splitlines():
+        section_match = _SECTION_RE.match(line.strip())
+        if section_match:
+            current_key = section_key_for(section_match.group(1))
+            in_style_block = False
+            lines.append(line)
+            continue
+        if _STYLE_HEADER_RE.match(line.strip()):
+            in_style_block = True
+            continue
+        if in_style_block:
+            style_match = _STYLE_LINE_RE.match(line)
+            if style_match:
+                field = STYLE_FIELDS.get(style_match.group(1).strip().lower())
+                if field and current_key:
+                    key, parse = field
+                    value = parse(style_match.group(2))
+                    if value is not None:
+                        section_styles.setdefault(current_key, {})[key] = value
+                continue
+            in_style_block = False
+        lines.append(line)
+
+    compact_prompt = "\n".join(lines)
+    # No style block found: leave user-written prompts byte-for-byte intact
+    if not section_styles and compact_prompt.strip() == template_prompt.strip():
+        return template_prompt, {}
+    compact_prompt = compact_prompt.replace(
+        "with the following structure and styling", "with the following structure"
+    ).replace(
+        "each with specific styling and semantic purposes", "each with a specific semantic purpose"
+    )
+    return compact_prompt, section_styles
+
+
+def compaction_savings(template_prompt, compact_prompt):
+    """
+    Measure the input tokens saved by prompt compaction.
+
+    Args:
+        template_prompt (str): The original template prompt.
+        compact_prompt (str): The prompt returned by compact_template_prompt.
+
+    Returns:
+        dict: Token counts before and after, tokens saved and the percentage saved.
+    """
+    before = estimate_tokens(template_prompt)
+    after = estimate_tokens(compact_prompt)
+    return {
+        "tokens_before": before,
+        "tokens_after": after,
+        "tokens_saved": before - after,
+        "percent_saved": round(100.0 * (before - after) / before, 1) if before else 0.0,
+    }
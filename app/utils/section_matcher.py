@@ -0,0 +1,272 @@
+import re
+import logging
+from collections import deque, Counter
+from functools import lru_cache
+from .similarity import similarity_matrix
+from .limits import Deadline
+from .ir import Section, StructuredDocument, SECTION_LIST, SECTION_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Fuzzy (TF-IDF n-gram) scores below this are ignored when ranking header candidates
+SIMILARITY_THRESHOLD = 0.3
+# Paragraphs this similar to another section's name end the current section's range
+HEADER_SIMILARITY_THRESHOLD = 0.75
+
+SECTION_PATTERN = re.compile(
+    r"\*\*Section:\s*([^\*]+)\*\*\s*- \*\*Purpose\*\*:\s*This section represents\s*([^\s]+)\s*content"
+)
+
+
+def parse_expected_sections(template_prompt_content):
+    """
+    Parse the expected sections from a template prompt.
+
+    Args:
+        template_prompt_content (str): The template prompt, as generated by create_prompt_from_file.
+
+    Returns:
+        list: (section_name (lowercased), section_key) tuples in template order.
+    """
+    expected_sections = []
+    for match in SECTION_PATTERN.finditer(template_prompt_content or ''):
+        section_name = match.group(1).strip()
+        section_key = match.group(2).strip()
+        expected_sections.append((section_name.lower(), section_key))
+    return expected_sections
+
+
+class PatternAutomaton:
+    """
+    Aho-Corasick automaton reporting which of a fixed set of substrings occur in a text, in one pass.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(set())
+                state = next_state
+            self._output[state].add(pattern_id)
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """
+        Return the set of pattern indices occurring anywhere in text.
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class SectionMatcher:
+    """
+    Map extracted document content to a template's expected sections.
+
+    Section names and their keywords are compiled once into a PatternAutomaton. Matching makes a
+    single pass over the paragraphs to collect header hits, then assigns content ranges linearly:
+    each section takes its best-scoring unused paragraph (1.0 for the full name, otherwise the
+    better of the fraction of its keywords present and its TF-IDF n-gram similarity) and the following
+    paragraphs up to the next paragraph that names or closely resembles another section, or a table.
+    """
+
+    def __init__(self, expected_sections, use_similarity=True):
+        self.expected_sections = list(expected_sections)
+        self.use_similarity = use_similarity
+        self._keyword_counts = []
+        patterns = {}
+        self._name_pattern = []
+        self._always_matches = set()
+        for section_idx, (section_name, _) in enumerate(self.expected_sections):
+            if not section_name:
+                # An empty name is a substring of everything
+                self._always_matches.add(section_idx)
+            else:
+                self._name_pattern.append((patterns.setdefault(section_name, len(patterns)), section_idx))
+            counts = Counter(section_name.split())
+            self._keyword_counts.append(counts)
+            for keyword in counts:
+                patterns.setdefault(keyword, len(patterns))
+
+        self._automaton = PatternAutomaton(sorted(patterns, key=patterns.get))
+        self._sections_by_name_pattern = {}
+        for pattern_id, section_idx in self._name_pattern:
+            self._sections_by_name_pattern.setdefault(pattern_id, []).append(section_idx)
+        self._keywords_by_pattern = {}
+        for section_idx, counts in enumerate(self._keyword_counts):
+            for keyword, multiplicity in counts.items():
+                self._keywords_by_pattern.setdefault(patterns[keyword], []).append((section_idx, multiplicity))
+
+    def _scan(self, raw_content, deadline):
+        """
+        Collect header hits for every paragraph in one pass.
+
+        Returns:
+            tuple: (candidates, names_in) where candidates[section_idx] maps paragraph index to score
+                and names_in[idx] is the set of section names found in that paragraph.
+        """
+        section_count = len(self.expected_sections)
+        exact = [set() for _ in range(section_count)]
+        keyword_sums = [Counter() for _ in range(section_count)]
+        names_in = {}
+        always_names = {self.expected_sections[s][0] for s in self._always_matches}
+
+        for idx, item in enumerate(raw_content):
+            deadline.check()
+            if item.kind != "paragraph":
+                continue
+            hits = self._automaton.find(item.text.lower())
+            names = set(always_names)
+            for section_idx in self._always_matches:
+                exact[section_idx].add(idx)
+            for pattern_id in hits:
+                for section_idx in self._sections_by_name_pattern.get(pattern_id, ()):
+                    exact[section_idx].add(idx)
+                    names.add(self.expected_sections[section_idx][0])
+                for section_idx, multiplicity in self._keywords_by_pattern.get(pattern_id, ()):
+                    keyword_sums[section_idx][idx] += multiplicity
+            if names:
+                names_in[idx] = names
+
+        candidates = []
+        for section_idx in range(section_count):
+            total = sum(self._keyword_counts[section_idx].values())
+            scores = {idx: count / total for idx, count in keyword_sums[section_idx].items()} if total else {}
+            candidates.append(scores)
+
+        if self.use_similarity and section_count:
+            self._add_similarity(raw_content, candidates, names_in)
+
+        for section_idx in range(section_count):
+            for idx in exact[section_idx]:
+                candidates[section_idx][idx] = 1.0
+        return candidates, names_in
+
+    def _add_similarity(self, raw_content, candidates, names_in):
+        """
+        Raise candidate scores with the batched TF-IDF similarity of every paragraph to every section.
+        """
+        paragraph_indices = [idx for idx, item in enumerate(raw_content) if item.kind == "paragraph"]
+        if not paragraph_indices:
+            return
+        section_names = [section_name for section_name, _ in self.expected_sections]
+        matrix = similarity_matrix([raw_content[idx].text for idx in paragraph_indices], section_names)
+        rows, section_idxs = (matrix >= SIMILARITY_THRESHOLD).nonzero()
+        for row, section_idx in zip(rows.tolist(), section_idxs.tolist()):
+            idx = paragraph_indices[row]
+            score = float(matrix[row, section_idx])
+            if score > candidates[section_idx].get(idx, 0):
+                candidates[section_idx][idx] = score
+            if score >= HEADER_SIMILARITY_THRESHOLD:
+                names_in.setdefault(idx, set()).add(section_names[section_idx])
+
+    def match(self, raw_content, deadline=None):
+        """
+        Build structured content from extracted paragraphs and tables.
+
+        Args:
+            raw_content (list): Paragraph and Table IR blocks, as yielded by ooxml_reader.iter_blocks.
+            deadline (Deadline, optional): Wall-clock budget; defaults to Deadline.for_parse().
+
+        Returns:
+            StructuredDocument: One list section per expected section_key, plus a "tables" section
+                holding unassigned tables.
+        """
+        deadline = deadline or Deadline.for_parse()
+        candidates, names_in = self._scan(raw_content, deadline)
+        sections = {}
+        used_content_indices = set()
+
+        for section_idx, (section_name, section_key) in enumerate(self.expected_sections):
+            deadline.check()
+            best_match_idx = -1
+            best_match_score = 0
+            for idx in sorted(candidates[section_idx]):
+                score = candidates[section_idx][idx]
+                if idx not in used_content_indices and score > best_match_score:
+                    best_match_score = score
+                    best_match_idx = idx
+            if best_match_idx < 0:
+                continue
+
+            # Collect content until the next section header or table
+            content = []
+            idx = best_match_idx
+            while idx < len(raw_content):
+                deadline.check()
+                item = raw_content[idx]
+                if idx in used_content_indices:
+                    idx += 1
+                    continue
+                if item.kind == "paragraph":
+                    if names_in.get(idx, set()) - {section_name}:
+                        break
+                    content.append(item.text)
+                    used_content_indices.add(idx)
+                elif item.kind == "table":
+                    # Tables are handled separately
+                    break
+                idx += 1
+            sections[section_key] = Section(section_key, SECTION_LIST, content)
+            used_content_indices.add(best_match_idx)
+
+        # Handle tables separately
+        tables = []
+        for idx, item in enumerate(raw_content):
+            if idx not in used_content_indices and item.kind == "table":
+                tables.append(item)
+                used_content_indices.add(idx)
+        if tables:
+            sections["tables"] = Section("tables", SECTION_TABLES, tables)
+
+        # Fill missing sections with empty lists
+        for _, section_key in self.expected_sections:
+            if section_key not in sections:
+                sections[section_key] = Section(section_key, SECTION_LIST, [])
+        return StructuredDocument(list(sections.values()))
+
+
+@lru_cache(maxsize=128)
+def get_section_matcher(expected_sections, use_similarity=True):
+    """
+    Return a compiled SectionMatcher for a template's expected sections, reusing earlier compilations.
+
+    Args:
+        expected_sections (tuple): (section_name, section_key) tuples, as from parse_expected_sections.
+        use_similarity (bool): Rank fuzzy header matches with the TF-IDF n-gram scorer.
+
+    Returns:
+        SectionMatcher: The compiled matcher.
+    """
+    return SectionMatcher(expected_sections, use_similarity)
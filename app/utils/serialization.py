@@ -0,0 +1,128 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to a character heuristic
+    _encoding = None
+
+_INLINE_WHITESPACE_RE = re.compile(r"[ \t\u00a0\u2000-\u200b\u3000]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+# Lines that carry no content for the model: page furniture, confidentiality footers, etc.
+BOILERPLATE_PATTERNS = [
+    re.compile(r"^page\s+\d+(\s+of\s+\d+)?$", re.IGNORECASE),
+    # Bare page numbers ("7", "- 7 -"); at most three digits so years and other figures are kept
+    re.compile(r"^(-\s*)?\d{1,3}(\s*-)?$"),
+    re.compile(r"^(strictly\s+)?(private\s+and\s+)?confidential\.?$", re.IGNORECASE),
+    re.compile(r"^references\s+(are\s+)?available\s+(up)?on\s+request\.?$", re.IGNORECASE),
+    re.compile(r"^curriculum\s+vitae$|^r[ée]sum[ée]$", re.IGNORECASE),
+]
+
+
+def normalize_whitespace(text):
+    """
+    Collapse runs of spaces, tabs and non-breaking spaces and trim the result.
+
+    Args:
+        text (str): The text to normalise.
+
+    Returns:
+        str: The normalised text. Line breaks are kept, but blank lines are collapsed.
+    """
+    lines = [_INLINE_WHITESPACE_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def is_boilerplate(text):
+    """
+    Check whether a paragraph is boilerplate that can be dropped before calling the LLM.
+
+    Args:
+        text (str): The normalised paragraph text.
+
+    Returns:
+        bool: True if the paragraph matches a known boilerplate pattern.
+    """
+    return any(pattern.match(text) for pattern in BOILERPLATE_PATTERNS)
+
+
+def serialize_table(rows, table_format="tsv"):
+    """
+    Serialize table rows into a compact, quote-free text form.
+
+    Args:
+        rows (list): Rows of cell strings, with cells covered by a merge already blank.
+        table_format (str): 'tsv' (tab separated) or 'markdown' (pipe separated).
+
+    Returns:
+        str: The serialized table, or '' if the table has no text.
+    """
+    separator = "\t" if table_format == "tsv" else " | "
+    lines = []
+    for row in rows:
+        cells = [normalize_whitespace(cell).replace("\n", " ").replace("\t", " ") for cell in row]
+        if table_format != "tsv":
+            cells = [cell.replace("|", "/") for cell in cells]
+        # Trailing empty cells only cost separators
+        while cells and not cells[-1]:
+            cells.pop()
+        if cells:
+            lines.append(separator.join(cells))
+    if not lines:
+        return ""
+    return "Table:\n" + "\n".join(lines)
+
+
+def serialize_blocks(blocks, strip_boilerplate=False, table_format="tsv"):
+    """
+    Serialize extracted document blocks into compact LLM-bound text.
+
+    Args:
+        blocks (iterable): Paragraph and Table IR blocks.
+        strip_boilerplate (bool): Drop page numbers, confidentiality footers and similar lines, and blocks
+            identical to the one before them (repeated headers and footers).
+        table_format (str): Table layout passed to serialize_table.
+
+    Returns:
+        str: The serialized content, one block per line.
+    """
+    lines = []
+    previous = None
+    for block in blocks:
+        if block.kind == "table":
+            text = serialize_table(block.rows, table_format)
+        else:
+            text = normalize_whitespace(block.text)
+            if strip_boilerplate and is_boilerplate(text):
+                continue
+        if not text:
+            continue
+        # Repeated headers/footers often come through as identical consecutive blocks
+        if strip_boilerplate and text == previous:
+            continue
+        lines.append(text)
+        previous = text
+    return "\n".join(lines)
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in a string.
+
+    Uses tiktoken when it is installed, otherwise roughly four characters per token.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
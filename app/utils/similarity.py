@@ -0,0 +1,113 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+BLOCK_ROWS = 4096
+_CODEPOINTS = 0x110000
+
+# Common alternative headings, so fuzzy matching can bridge different wording for the same section
+SECTION_ALIASES = {
+    "professional experience": ["career history", "work history", "employment history", "work experience", "career experience"],
+    "experience": ["career history", "work history", "employment"],
+    "professional summary": ["profile", "summary", "career summary", "executive summary", "about me"],
+    "core competencies": ["skills", "key skills", "areas of expertise", "core skills", "technical skills"],
+    "education": ["academic background", "qualifications", "education and training"],
+    "contact": ["contact details", "contact information", "personal details"],
+    "professional affiliations": ["memberships", "affiliations", "professional memberships"],
+    "certifications": ["licenses", "certificates", "accreditations"],
+}
+
+
+def _ngram_entries(texts, n):
+    """
+    Count character n-grams of every text in one vectorised pass.
+
+    Returns:
+        tuple: (rows, cols, counts, vocabulary_size) describing a sparse document-term matrix.
+    """
+    padded = [f" {text.lower()} " for text in texts]
+    lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer("\x00".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    windows = len(codes) - n + 1
+    if windows <= 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64), 0
+
+    grams = np.zeros(windows, dtype=np.int64)
+    for offset in range(n):
+        grams = grams * _CODEPOINTS + codes[offset:offset + windows]
+    # Drop n-grams spanning the separator between two texts
+    separators = np.concatenate(([0], np.cumsum(codes == 0)))
+    valid = (separators[n:n + windows] - separators[:windows]) == 0
+    row_of = np.repeat(np.arange(len(texts), dtype=np.int64), lengths + 1)[:windows]
+
+    vocabulary, cols = np.unique(grams[valid], return_inverse=True)
+    pairs, counts = np.unique(row_of[valid] * len(vocabulary) + cols, return_counts=True)
+    return pairs // len(vocabulary), pairs % len(vocabulary), counts, len(vocabulary)
+
+
+def similarity_matrix(paragraphs, section_names, n=NGRAM_SIZE):
+    """
+    Score every paragraph against every section name with TF-IDF weighted character n-grams.
+
+    All paragraphs and section names (plus their SECTION_ALIASES) share one vocabulary and IDF. The
+    paragraph-by-query cosine matrix is computed with dense matrix products over the n-grams that
+    occur in section names, in row blocks to bound memory.
+
+    Args:
+        paragraphs (list): Paragraph texts.
+        section_names (list): Section names, in template order.
+        n (int): The character n-gram size.
+
+    Returns:
+        numpy.ndarray: A (len(paragraphs), len(section_names)) array of cosine similarities in [0, 1],
+            taking the best alias for each section.
+    """
+    paragraph_count = len(paragraphs)
+    scores = np.zeros((paragraph_count, len(section_names)), dtype=np.float32)
+    if not paragraph_count or not section_names:
+        return scores
+
+    queries = []
+    query_section = []
+    for section_idx, name in enumerate(section_names):
+        for variant in [name] + SECTION_ALIASES.get(name.lower().strip(), []):
+            queries.append(variant)
+            query_section.append(section_idx)
+
+    rows, cols, counts, vocabulary_size = _ngram_entries(list(paragraphs) + queries, n)
+    if not vocabulary_size:
+        return scores
+    document_count = paragraph_count + len(queries)
+    document_frequency = np.bincount(cols, minlength=vocabulary_size)
+    idf = np.log((1 + document_count) / (1 + document_frequency)) + 1.0
+    weights = (1.0 + np.log(counts)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=document_count))
+    weights = weights / np.maximum(norms[rows], 1e-12)
+
+    # Dense query matrix over the n-grams that appear in any query
+    is_query = rows >= paragraph_count
+    query_vocabulary = np.unique(cols[is_query])
+    query_matrix = np.zeros((len(query_vocabulary), len(queries)), dtype=np.float32)
+    query_matrix[np.searchsorted(query_vocabulary, cols[is_query]), rows[is_query] - paragraph_count] = weights[is_query]
+
+    relevant = ~is_query & np.isin(cols, query_vocabulary)
+    p_rows = rows[relevant]
+    p_cols = np.searchsorted(query_vocabulary, cols[relevant])
+    p_weights = weights[relevant].astype(np.float32)
+
+    query_scores = np.zeros((paragraph_count, len(queries)), dtype=np.float32)
+    boundaries = np.searchsorted(p_rows, np.arange(0, paragraph_count + BLOCK_ROWS, BLOCK_ROWS))
+    for block, start in enumerate(range(0, paragraph_count, BLOCK_ROWS)):
+        stop = min(start + BLOCK_ROWS, paragraph_count)
+        lo, hi = boundaries[block], boundaries[block + 1]
+        dense = np.zeros((stop - start, len(query_vocabulary)), dtype=np.float32)
+        dense[p_rows[lo:hi] - start, p_cols[lo:hi]] = p_weights[lo:hi]
+        query_scores[start:stop] = dense @ query_matrix
+
+    # Best alias per section
+    query_section = np.asarray(query_section)
+    for section_idx in range(len(section_names)):
+        scores[:, section_idx] = query_scores[:, query_section == section_idx].max(axis=1)
+    return np.clip(scores, 0.0, 1.0)
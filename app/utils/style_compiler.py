@@ -0,0 +1,233 @@
+from copy import deepcopy
+from docx.oxml.ns import qn
+from docx.shared import Pt, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.enum.style import WD_STYLE_TYPE
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALIGNMENTS = {
+    "left": WD_ALIGN_PARAGRAPH.LEFT,
+    "center": WD_ALIGN_PARAGRAPH.CENTER,
+    "right": WD_ALIGN_PARAGRAPH.RIGHT,
+    "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
+}
+
+# The formatting the builder applies to a paragraph and its run
+FORMAT_KEYS = ("font_name", "font_size_pt", "bold", "color_rgb", "alignment", "spacing_before_pt", "spacing_after_pt")
+
+W_R = qn("w:r")
+W_T = qn("w:t")
+
+# "direct" stamps full run/paragraph formatting on every paragraph; "named" defines DR * styles once in
+# styles.xml and has paragraphs reference them by ID
+STYLE_MODES = ("direct", "named")
+DEFAULT_STYLE_MODE = os.environ.get('OUTPUT_STYLE_MODE', 'direct')
+
+# Named-style display names per role; a second format for the same role becomes e.g. "DR Header 2"
+ROLE_STYLE_NAMES = {
+    "name": "DR Name",
+    "contact": "DR Contact",
+    "header": "DR Header",
+    "body": "DR Body",
+    "bullet": "DR Bullet",
+    "table": "DR Table",
+}
+
+
+def resolve_format(style, font_name="Arial", font_size_pt=11, bold=False, color_rgb=(0, 0, 0),
+                   alignment="left", spacing_before_pt=6, spacing_after_pt=6):
+    """
+    Resolve a template style dict into a complete format, filling gaps with the given defaults.
+
+    An alignment the builder does not know falls back to the default alignment.
+
+    Returns:
+        dict: One value per FORMAT_KEYS entry.
+    """
+    resolved = {
+        "font_name": style.get("font_name", font_name),
+        "font_size_pt": style.get("font_size_pt", font_size_pt),
+        "bold": style.get("bold", bold),
+        "color_rgb": tuple(style.get("color_rgb", color_rgb)),
+        "alignment": style.get("alignment", alignment),
+        "spacing_before_pt": style.get("spacing_before_pt", spacing_before_pt),
+        "spacing_after_pt": style.get("spacing_after_pt", spacing_after_pt),
+    }
+    if resolved["alignment"] not in ALIGNMENTS:
+        resolved["alignment"] = alignment
+    return resolved
+
+
+def name_format(style):
+    """
+    The format of the name line: the header style, slightly larger and centered.
+    """
+    fmt = resolve_format(style, font_size_pt=14, bold=True, spacing_before_pt=12, spacing_after_pt=12)
+    fmt["font_size_pt"] += 2  # Slightly larger for name
+    fmt["alignment"] = "center"
+    return fmt
+
+
+def contact_format(style):
+    """
+    The format of the contact line: the header style, not bold, centered.
+    """
+    fmt = resolve_format(style, spacing_before_pt=12, spacing_after_pt=12)
+    fmt["bold"] = False  # Contact info typically not bold
+    fmt["alignment"] = "center"
+    return fmt
+
+
+def section_header_format(style):
+    return resolve_format(style, font_size_pt=12, bold=True, alignment="center", spacing_before_pt=12, spacing_after_pt=12)
+
+
+class StyleCompiler:
+    """
+    Compile formats into prebuilt w:p fragments (w:pPr plus a w:r carrying w:rPr) and stamp copies of them.
+
+    Each distinct format is compiled once, by applying the python-docx setters to a scratch paragraph of
+    the output document, so the stamped XML is exactly what setting each attribute would produce. Every
+    later paragraph, list item or table cell with that format is a deepcopy plus its text.
+
+    In "named" mode each distinct (role, format) instead becomes a paragraph style in styles.xml
+    (DR Header, DR Body, DR Bullet, ...), and fragments carry only a w:pStyle reference.
+    """
+
+    def __init__(self, doc, style_mode=None):
+        self.doc = doc
+        self.style_mode = style_mode or DEFAULT_STYLE_MODE
+        if self.style_mode not in STYLE_MODES:
+            raise ValueError(f"Unknown style mode '{self.style_mode}', expected one of {STYLE_MODES}")
+        self._fragments = {}
+        self._style_names = set()
+
+    def _define_style(self, role, fmt, paragraph_style):
+        base_name = ROLE_STYLE_NAMES.get(role, f"DR {role.title()}")
+        styles = self.doc.styles
+        name = base_name
+        counter = 2
+        # A template made from an earlier output already has DR styles; paragraph ones are redefined in place
+        while name in self._style_names or (name in styles and styles[name].type != WD_STYLE_TYPE.PARAGRAPH):
+            name = f"{base_name} {counter}"
+            counter += 1
+        self._style_names.add(name)
+
+        style = styles[name] if name in styles else styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        # Bullets keep their numbering by inheriting from the built-in list style
+        style.base_style = self.doc.styles[paragraph_style] if paragraph_style else self.doc.styles["Normal"]
+        style.quick_style = True
+        style.font.name = fmt["font_name"]
+        style.font.size = Pt(fmt["font_size_pt"])
+        style.font.bold = fmt["bold"]
+        style.font.color.rgb = RGBColor(*fmt["color_rgb"])
+        style.paragraph_format.alignment = ALIGNMENTS[fmt["alignment"]]
+        style.paragraph_format.space_before = Pt(fmt["spacing_before_pt"])
+        style.paragraph_format.space_after = Pt(fmt["spacing_after_pt"])
+        return style
+
+    def _compile_named(self, role, fmt, paragraph_style):
+        style = self._define_style(role, fmt, paragraph_style)
+        para = self.doc.add_paragraph("x", style=style)
+        fragment = para._p
+        fragment.getparent().remove(fragment)
+        for text in fragment.iter(W_T):
+            text.getparent().remove(text)
+        return fragment
+
+    def _compile(self, fmt, paragraph_style):
+        para = self.doc.add_paragraph("x", style=paragraph_style)
+        run = para.runs[0]
+        run.font.name = fmt["font_name"]
+        run.font.size = Pt(fmt["font_size_pt"])
+        run.bold = fmt["bold"]
+        run.font.color.rgb = RGBColor(*fmt["color_rgb"])
+        para.paragraph_format.alignment = ALIGNMENTS[fmt["alignment"]]
+        para.paragraph_format.space_before = Pt(fmt["spacing_before_pt"])
+        para.paragraph_format.space_after = Pt(fmt["spacing_after_pt"])
+
+        fragment = para._p
+        fragment.getparent().remove(fragment)
+        for text in fragment.iter(W_T):
+            text.getparent().remove(text)
+        return fragment
+
+    def fragment(self, fmt, paragraph_style=None, role="body"):
+        """
+        Return the compiled w:p for a format (shared; copy it before inserting).
+        """
+        if self.style_mode == "named":
+            key = (role, tuple(fmt[name] for name in FORMAT_KEYS), paragraph_style)
+        else:
+            key = (tuple(fmt[name] for name in FORMAT_KEYS), paragraph_style)
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            if self.style_mode == "named":
+                fragment = self._compile_named(role, fmt, paragraph_style)
+            else:
+                fragment = self._compile(fmt, paragraph_style)
+            self._fragments[key] = fragment
+        return fragment
+
+    def stamp(self, text, fmt, paragraph_style=None, keep_empty_run=False, role="body"):
+        """
+        Return a new w:p with the format applied and the given text.
+        """
+        p = deepcopy(self.fragment(fmt, paragraph_style, role))
+        run = p.find(W_R)
+        if text:
+            # CT_R.text converts tabs and line breaks, as python-docx's add_paragraph(text) does
+            run.text = text
+        elif not keep_empty_run:
+            p.remove(run)
+        return p
+
+    def add_paragraph(self, text, fmt, paragraph_style=None, role="body"):
+        """
+        Append a formatted paragraph to the document body.
+
+        Args:
+            text (str): The paragraph text.
+            fmt (dict): The format, from resolve_format.
+            paragraph_style (str, optional): A built-in style to base the paragraph on (e.g. "List Bullet").
+            role (str): What the paragraph is (name, contact, header, body, bullet, table), naming its style in "named" mode.
+        """
+        p = self.stamp(text, fmt, paragraph_style, role=role)
+        self.doc.element.body._insert_p(p)
+        return p
+
+    def fill_cell(self, tc, text, fmt):
+        """
+        Replace a table cell's content with one formatted paragraph, as ``cell.text = text`` plus formatting would.
+        """
+        tc.clear_content()
+        tc.append(self.stamp(text, fmt, keep_empty_run=True, role="table"))
+
+    def add_table(self, table_data, fmt, deadline=None):
+        """
+        Append a table (an ir.Table) to the document body, with every cell formatted and merges recreated.
+        """
+        table = self.doc.add_table(rows=len(table_data.rows), cols=table_data.column_count or 1)
+        # Cells a merge will cover keep their bare <w:p/> unless they have text: merge() moves any cell
+        # content with a run into the merged cell, which would leave it with extra empty paragraphs
+        covered = set()
+        for row_idx, col_idx, row_span, col_span in table_data.merges:
+            covered.update(
+                (r, c) for r in range(row_idx, row_idx + row_span) for c in range(col_idx, col_idx + col_span)
+            )
+            covered.discard((row_idx, col_idx))
+        # The new table has no merges yet, so grid positions map directly onto w:tc elements
+        for row_idx, (tr, row) in enumerate(zip(table._tbl.tr_lst, table_data.rows)):
+            if deadline is not None:
+                deadline.check()
+            for col_idx, (tc, cell_text) in enumerate(zip(tr.tc_lst, row)):
+                if (row_idx, col_idx) in covered and not cell_text:
+                    continue
+                self.fill_cell(tc, cell_text, fmt)
+        # Recreate merged regions from the source table
+        for row_idx, col_idx, row_span, col_span in table_data.merges:
+            table.cell(row_idx, col_idx).merge(table.cell(row_idx + row_span - 1, col_idx + col_span - 1))
+        return table
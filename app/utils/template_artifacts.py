@@ -0,0 +1,238 @@
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from copy import deepcopy
+from io import BytesIO
+import hashlib
+import json
+import os
+import logging
+from .database import get_db_connection
+from .template_styles import extract_style_profile, template_hash, STYLE_PROFILE_VERSION
+from .prompt_compaction import compact_template_prompt
+from .section_matcher import parse_expected_sections
+from .metrics import increment
+
+logger = logging.getLogger(__name__)
+
+# "template" builds outputs into the template's own package with its body removed (keeping page setup,
+# numbering, headers and footers); "default" uses python-docx's bundled default document
+SKELETON_MODE = os.environ.get('OUTPUT_SKELETON', 'template')
+
+# Bump whenever compute_artifacts' output changes, so stored artifacts are recomputed on next use
+ARTIFACTS_VERSION = f"2.{STYLE_PROFILE_VERSION}.{SKELETON_MODE}"
+
+# Body content relationships that are dropped with the body; headers, footers, styles etc. are kept
+BODY_RELATIONSHIP_TYPES = {RT.IMAGE, RT.HYPERLINK, RT.OLE_OBJECT, RT.PACKAGE, RT.CHART, RT.DIAGRAM_DATA,
+                           RT.DIAGRAM_LAYOUT, RT.DIAGRAM_QUICK_STYLE, RT.DIAGRAM_COLORS}
+W_NUM = qn("w:num")
+W_ABSTRACT_NUM = qn("w:abstractNum")
+W_ABSTRACT_NUM_ID = qn("w:abstractNumId")
+W_NUM_ID = qn("w:numId")
+W_VAL = qn("w:val")
+
+
+def prompt_hash(template_prompt_content):
+    return hashlib.sha256((template_prompt_content or '').encode('utf-8')).hexdigest()
+
+
+def _strip_body(doc):
+    """
+    Remove all body content except the final section properties, and the relationships only it used.
+    """
+    body = doc.element.body
+    for child in list(body):
+        if child is not body.sectPr:
+            body.remove(child)
+    referenced = set(doc.element.xpath('//@r:id | //@r:embed | //@r:link'))
+    for rel_id, rel in list(doc.part.rels.items()):
+        if rel.reltype in BODY_RELATIONSHIP_TYPES and rel_id not in referenced:
+            doc.part.drop_rel(rel_id)
+
+
+def _ensure_list_bullet(doc):
+    """
+    Give a template without a "List Bullet" paragraph style the default one, with its bullet numbering.
+    """
+    try:
+        doc.styles["List Bullet"]
+        return
+    except KeyError:
+        pass
+
+    default = Document()
+    style = deepcopy(default.styles["List Bullet"].element)
+    default_numbering = default.part.numbering_part.element
+    try:
+        numbering = doc.part.part_related_by(RT.NUMBERING).element
+    except KeyError:
+        # No numbering part at all: bring the default one over, where the style's numId already resolves
+        doc.part.relate_to(default.part.numbering_part, RT.NUMBERING)
+    else:
+        # Copy the bullet definition under ids that are free in the template's numbering
+        num_id = style.find(f'{qn("w:pPr")}/{qn("w:numPr")}/{W_NUM_ID}')
+        num = next(n for n in default_numbering.iter(W_NUM) if n.get(W_NUM_ID) == num_id.get(W_VAL))
+        abstract_id = num.find(W_ABSTRACT_NUM_ID).get(W_VAL)
+        abstract = next(a for a in default_numbering.iter(W_ABSTRACT_NUM) if a.get(W_ABSTRACT_NUM_ID) == abstract_id)
+
+        new_abstract_id = str(max((int(a.get(W_ABSTRACT_NUM_ID)) for a in numbering.iter(W_ABSTRACT_NUM)), default=-1) + 1)
+        new_num_id = str(max((int(n.get(W_NUM_ID)) for n in numbering.iter(W_NUM)), default=0) + 1)
+        abstract = deepcopy(abstract)
+        abstract.set(W_ABSTRACT_NUM_ID, new_abstract_id)
+        num = deepcopy(num)
+        num.set(W_NUM_ID, new_num_id)
+        num.find(W_ABSTRACT_NUM_ID).set(W_VAL, new_abstract_id)
+        num_id.set(W_VAL, new_num_id)
+
+        # Schema order: every w:abstractNum before the first w:num
+        first_num = numbering.find(W_NUM)
+        if first_num is not None:
+            first_num.addprevious(abstract)
+        else:
+            numbering.append(abstract)
+        numbering.append(num)
+    doc.styles.element.append(style)
+    logger.info("Added a List Bullet style to the template skeleton")
+
+
+def build_skeleton(template_file=None):
+    """
+    Return the empty package create_reformatted_docx starts each output from.
+
+    In "template" mode (OUTPUT_SKELETON) this is the template itself with the body removed, so outputs
+    keep its page setup, styles, numbering, headers and footers.
+    """
+    if template_file is None or SKELETON_MODE != "template":
+        doc = Document()
+    else:
+        doc = Document(BytesIO(template_file))
+        _strip_body(doc)
+        _ensure_list_bullet(doc)
+    stream = BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def compute_artifacts(template_file, template_prompt_content):
+    """
+    Run all template analysis once: style profile, heading detection, prompt sections and builder skeleton.
+
+    Args:
+        template_file (bytes): The template .docx file.
+        template_prompt_content (str): The template's prompt, or None.
+
+    Returns:
+        dict: template_hash, prompt_hash, style_profile, headings, expected_sections, compact_prompt,
+            section_styles and skeleton.
+    """
+    style_profile = extract_style_profile(template_file)
+    compact_prompt, section_styles = compact_template_prompt(template_prompt_content or '')
+    return {
+        "version": ARTIFACTS_VERSION,
+        "template_hash": template_hash(template_file),
+        "prompt_hash": prompt_hash(template_prompt_content),
+        "style_profile": style_profile,
+        "headings": [section["header"] for section in style_profile["sections"]],
+        "expected_sections": parse_expected_sections(template_prompt_content),
+        "compact_prompt": compact_prompt,
+        "section_styles": section_styles,
+        "skeleton": build_skeleton(template_file),
+    }
+
+
+def save_artifacts(cur, template_id, artifacts):
+    cur.execute(
+        "INSERT INTO template_artifacts (template_id, version, template_hash, prompt_hash, style_profile, headings, "
+        "expected_sections, compact_prompt, section_styles, skeleton) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
+        "ON CONFLICT (template_id) DO UPDATE SET version = EXCLUDED.version, template_hash = EXCLUDED.template_hash, "
+        "prompt_hash = EXCLUDED.prompt_hash, style_profile = EXCLUDED.style_profile, headings = EXCLUDED.headings, "
+        "expected_sections = EXCLUDED.expected_sections, compact_prompt = EXCLUDED.compact_prompt, "
+        "section_styles = EXCLUDED.section_styles, skeleton = EXCLUDED.skeleton, updated_at = NOW()",
+        (
+            template_id, artifacts["version"], artifacts["template_hash"], artifacts["prompt_hash"],
+            json.dumps(artifacts["style_profile"]), json.dumps(artifacts["headings"]),
+            json.dumps(artifacts["expected_sections"]), artifacts["compact_prompt"],
+            json.dumps(artifacts["section_styles"]), artifacts["skeleton"]
+        )
+    )
+
+
+def refresh_template_artifacts(cur, template_id, defer_errors=True):
+    """
+    Recompute and store a template's artifacts after it changes, using the caller's cursor and transaction.
+
+    Templates without a file have no artifacts; any stale row is removed. With defer_errors, a template
+    whose artifacts cannot be computed is logged and left without artifacts, so saving it still succeeds;
+    get_template_artifacts computes them at the first conversion and reports the error there.
+    """
+    cur.execute(
+        "SELECT t.template_file, p.content FROM templates t "
+        "LEFT JOIN prompts p ON t.template_prompt_id = p.id WHERE t.id = %s",
+        (template_id,)
+    )
+    row = cur.fetchone()
+    if not row or not row[0]:
+        cur.execute("DELETE FROM template_artifacts WHERE template_id = %s", (template_id,))
+        return None
+    try:
+        artifacts = compute_artifacts(bytes(row[0]), row[1])
+    except Exception as e:
+        if not defer_errors:
+            raise
+        logger.error(f"Failed to compute artifacts for template ID {template_id}, deferring to first use: {str(e)}")
+        cur.execute("DELETE FROM template_artifacts WHERE template_id = %s", (template_id,))
+        return None
+    save_artifacts(cur, template_id, artifacts)
+    logger.info(f"Precomputed artifacts for template ID {template_id} ({len(artifacts['expected_sections'])} sections, "
+                f"{len(artifacts['headings'])} headings)")
+    return artifacts
+
+
+def get_template_artifacts(template_id, user_id):
+    """
+    Load the precomputed artifacts for a conversion, without reading or parsing the template file.
+
+    Artifacts missing (templates created before precomputation), from an older version, or computed from a
+    prompt that has since been edited are recomputed and stored once.
+
+    Returns:
+        dict: The artifacts (see compute_artifacts), or None if the template has no file.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT a.version, a.template_hash, a.prompt_hash, a.style_profile, a.headings, a.expected_sections, "
+        "a.compact_prompt, a.section_styles, a.skeleton, p.content "
+        "FROM templates t "
+        "LEFT JOIN prompts p ON t.template_prompt_id = p.id "
+        "LEFT JOIN template_artifacts a ON a.template_id = t.id "
+        "WHERE t.id = %s AND t.user_id = %s",
+        (template_id, user_id)
+    )
+    row = cur.fetchone()
+    artifacts = None
+    if row:
+        version, stored_template_hash, stored_prompt_hash = row[0], row[1], row[2]
+        if version == ARTIFACTS_VERSION and stored_prompt_hash == prompt_hash(row[9]):
+            increment("template_artifacts", result="hit")
+            artifacts = {
+                "version": version,
+                "template_hash": stored_template_hash,
+                "prompt_hash": stored_prompt_hash,
+                "style_profile": row[3],
+                "headings": row[4],
+                "expected_sections": [tuple(section) for section in row[5]],
+                "compact_prompt": row[6],
+                "section_styles": row[7],
+                "skeleton": bytes(row[8]),
+            }
+        else:
+            increment("template_artifacts", result="miss")
+            artifacts = refresh_template_artifacts(cur, template_id, defer_errors=False)
+            conn.commit()
+    if artifacts is not None:
+        artifacts["template_prompt_content"] = row[9]
+    cur.close()
+    conn.close()
+    return artifacts
@@ -0,0 +1,143 @@
+from docx import Document
+from docx.shared import Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from io import BytesIO
+import hashlib
+import json
+import zipfile
+import logging
+from .cache import TieredCache
+from .limits import Deadline, ElementBudget, check_package
+from .metrics import increment
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever extract_style_profile's output changes, so cached profiles are invalidated
+STYLE_PROFILE_VERSION = "1"
+
+ALIGNMENT_NAMES = {
+    WD_ALIGN_PARAGRAPH.LEFT: "left",
+    WD_ALIGN_PARAGRAPH.CENTER: "center",
+    WD_ALIGN_PARAGRAPH.RIGHT: "right",
+    WD_ALIGN_PARAGRAPH.JUSTIFY: "justify"
+}
+
+# Style profiles keyed by template content hash; STYLE_CACHE_DIR enables the on-disk tier
+style_cache = TieredCache.from_env('STYLE_CACHE', maxsize=64, max_bytes=8 * 1024 * 1024)
+
+
+def template_hash(template_file):
+    """
+    Return the sha256 hex digest of a template's bytes.
+    """
+    return hashlib.sha256(template_file).hexdigest()
+
+
+def _color(run):
+    # RGBColor is a tuple of (red, green, blue); theme colors have no rgb
+    if run and run.font.color and run.font.color.rgb:
+        return list(run.font.color.rgb)
+    return [0, 0, 0]
+
+
+def extract_style_profile(template_file):
+    """
+    Derive the styling of a template in a single pass over its paragraphs.
+
+    Templates are held to the same package, element and parse-time budgets as source documents.
+
+    Args:
+        template_file (bytes): The template .docx file.
+
+    Returns:
+        dict: {"header": style or None, "body": style or None, "sections": [...]}. "header" and "body" are
+            the first header-like and body paragraph styles, used by create_reformatted_docx; "sections"
+            lists each header paragraph with its style and following content, used by create_prompt_from_file.
+    """
+    template_stream = BytesIO(template_file)
+    with zipfile.ZipFile(template_stream) as zf:
+        check_package(zf)
+    doc = Document(template_stream)
+
+    deadline = Deadline.for_parse()
+    budget = ElementBudget()
+    profile = {"header": None, "body": None, "sections": []}
+    for para in doc.paragraphs:
+        deadline.check()
+        budget.add(1 + len(para._p.r_lst))
+        text = para.text.strip()
+        if not text:
+            continue
+        run = para.runs[0] if para.runs else None
+        alignment = para.paragraph_format.alignment
+        space_before = para.paragraph_format.space_before
+        space_after = para.paragraph_format.space_after
+
+        # Builder styles: a header is bold, larger than 11pt or uppercase
+        is_header = bool(
+            run and (
+                run.bold or
+                (run.font.size and run.font.size.pt > 11) or
+                para.text.isupper()
+            )
+        )
+        style_type = "header" if is_header else "body"
+        # Only keep the first occurrence of each
+        if profile[style_type] is None:
+            profile[style_type] = {
+                "font_name": run.font.name if run and run.font.name else "Arial",
+                "font_size_pt": run.font.size.pt if run and run.font.size else (12 if is_header else 11),
+                "bold": run.bold if run and run.bold is not None else is_header,
+                "color_rgb": _color(run),
+                "alignment": ALIGNMENT_NAMES.get(alignment, "center" if is_header else "left"),
+                "spacing_before_pt": space_before.pt if space_before else 12 if is_header else 6,
+                "spacing_after_pt": space_after.pt if space_after else 12 if is_header else 6,
+                "is_horizontal_list": "•" in para.text and para.text.count('\n') <= 1
+            }
+
+        # Prompt sections: a header is bold, larger than 12pt or uppercase
+        is_section_header = bool(
+            run and (run.bold or (run.font.size is not None and run.font.size > Pt(12))) or
+            text.isupper()
+        )
+        if is_section_header:
+            profile["sections"].append({
+                "header": text,
+                "style": {
+                    "font": run.font.name or "Arial" if run else "Arial",
+                    "size_pt": run.font.size.pt if run and run.font.size else 12,
+                    "bold": run.bold if run and run.bold is not None else False,
+                    "color_rgb": _color(run),
+                    "alignment": ALIGNMENT_NAMES.get(alignment, "left"),
+                    "spacing_before_pt": space_before.pt if space_before else 6,
+                    "spacing_after_pt": space_after.pt if space_after else 6,
+                    "is_horizontal_list": "•" in text and text.count('\n') <= 1
+                },
+                "content": []
+            })
+        elif profile["sections"]:
+            profile["sections"][-1]["content"].append(text)
+    return profile
+
+
+def get_style_profile(template_file, content_hash=None):
+    """
+    Return the style profile of a template, extracting it only the first time a template's bytes are seen.
+
+    Args:
+        template_file (bytes): The template .docx file.
+        content_hash (str, optional): template_hash(template_file), if already known.
+
+    Returns:
+        dict: The profile from extract_style_profile (a fresh copy, safe to modify).
+    """
+    cache_key = f"styles-v{STYLE_PROFILE_VERSION}-{content_hash or template_hash(template_file)}"
+    cached = style_cache.get(cache_key)
+    if cached is not None:
+        increment("style_profile_cache", result="hit")
+        return json.loads(cached)
+    increment("style_profile_cache", result="miss")
+    profile = extract_style_profile(template_file)
+    style_cache.set(cache_key, json.dumps(profile).encode("utf-8"))
+    logger.info(f"Extracted style profile for template {cache_key}")
+    return profile
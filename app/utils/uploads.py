@@ -0,0 +1,173 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import deque
+from flask import Request, request
+from flask_login import current_user
+from werkzeug.exceptions import RequestEntityTooLarge
+from .metrics import increment
+
+logger = logging.getLogger(__name__)
+
+# Uploads larger than this are spooled to a temporary file instead of held in memory
+UPLOAD_SPOOL_THRESHOLD = int(float(os.environ.get('UPLOAD_SPOOL_THRESHOLD_MB', 1)) * 1024 * 1024)
+
+
+def max_upload_bytes():
+    """
+    Return the per-request upload limit (MAX_UPLOAD_MB, default 16 MB) for MAX_CONTENT_LENGTH.
+    """
+    return int(float(os.environ.get('MAX_UPLOAD_MB', 16)) * 1024 * 1024)
+
+
+class HashingSpooledFile:
+    """
+    A SpooledTemporaryFile that computes the sha256 of everything written to it.
+
+    Werkzeug's form parser writes each uploaded file into this object chunk by chunk, so the content
+    hash is ready as soon as the upload is received, without reading the file again.
+    """
+
+    def __init__(self, max_size=UPLOAD_SPOOL_THRESHOLD):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class SpoolingRequest(Request):
+    """
+    Request class that receives uploaded files into HashingSpooledFile objects.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpooledFile()
+
+
+def upload_hash(file_storage):
+    """
+    Return the sha256 hex digest computed while receiving an uploaded file, or None if unavailable.
+    """
+    stream = getattr(file_storage, 'stream', None)
+    return stream.hexdigest() if isinstance(stream, HashingSpooledFile) else None
+
+
+def upload_size(file_storage):
+    """
+    Return the size in bytes of an uploaded file.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, HashingSpooledFile):
+        return stream.size
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+class UploadQuota:
+    """
+    Per-user upload byte quota over a rolling time window.
+
+    Usage is tracked in process memory, so with several gunicorn workers each enforces its own share.
+    """
+
+    def __init__(self, limit_bytes, window_s=3600):
+        self.limit_bytes = limit_bytes
+        self.window_s = window_s
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            limit_bytes=int(float(os.environ.get('UPLOAD_QUOTA_MB', 200)) * 1024 * 1024),
+            window_s=float(os.environ.get('UPLOAD_QUOTA_WINDOW_S', 3600)),
+        )
+
+    def _used(self, user_id, now):
+        usage = self._usage.setdefault(user_id, deque())
+        while usage and usage[0][0] <= now - self.window_s:
+            usage.popleft()
+        return usage, sum(size for _, size in usage)
+
+    def _exceeded(self, used):
+        increment("upload_quota_exceeded")
+        return RequestEntityTooLarge(
+            f"Upload quota exceeded: {used // (1024 * 1024)} MB of "
+            f"{self.limit_bytes // (1024 * 1024)} MB used in the last {int(self.window_s // 60)} minutes."
+        )
+
+    def check(self, user_id, nbytes):
+        """
+        Check that nbytes would fit in a user's quota, without charging them.
+
+        Raises:
+            RequestEntityTooLarge: If the upload would exceed the user's quota for the window.
+        """
+        with self._lock:
+            _, used = self._used(user_id, time.monotonic())
+            if used + nbytes > self.limit_bytes:
+                raise self._exceeded(used)
+
+    def consume(self, user_id, nbytes):
+        """
+        Charge nbytes to a user's quota.
+
+        Raises:
+            RequestEntityTooLarge: If the upload would exceed the user's quota for the window.
+        """
+        now = time.monotonic()
+        with self._lock:
+            usage, used = self._used(user_id, now)
+            if used + nbytes > self.limit_bytes:
+                raise self._exceeded(used)
+            usage.append((now, nbytes))
+        increment("upload_bytes", nbytes)
+
+
+upload_quota = UploadQuota.from_env()
+
+
+def check_upload_quota():
+    """
+    before_request hook for blueprints that accept uploads: refuse a multipart POST from Content-Length before
+    its body is read, so over-quota uploads are never spooled. Nothing is charged here; handlers charge the
+    uploads they accept with charge_uploads.
+    """
+    if (request.method == 'POST' and request.mimetype == 'multipart/form-data' and request.content_length
+            and current_user.is_authenticated):
+        upload_quota.check(current_user.id, request.content_length)
+
+
+def charge_uploads(*file_storages):
+    """
+    Charge accepted uploads to the current user's quota, by their received size.
+
+    Raises:
+        RequestEntityTooLarge: If the uploads would exceed the user's quota for the window.
+    """
+    upload_quota.consume(current_user.id, sum(upload_size(file_storage) for file_storage in file_storages))
@@ -0,0 +1,110 @@
+"""
+Benchmark docx output building: per-attribute python-docx setters against create_reformatted_docx.
+
+The legacy build applies font name, size, bold, colour, alignment and spacing through python-docx
+proxies for every paragraph, as create_reformatted_docx did before the style compiler. Both builds
+produce the same section headers and bullets and include saving the package. The named build uses
+style_mode="named" (DR * styles in styles.xml); output sizes of word/document.xml are reported too.
+
+Usage:
+    python benchmarks/bench_docx_builder.py [--paragraphs 5000] [--sections 10] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from docx import Document
+from docx.shared import Pt, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from app.utils.docx_builder import create_reformatted_docx
+
+HEADER = {"font_name": "Georgia", "font_size_pt": 14, "bold": True, "color_rgb": [31, 56, 100],
+          "alignment": "left", "spacing_before_pt": 12, "spacing_after_pt": 6}
+BODY = {"font_name": "Calibri", "font_size_pt": 11, "bold": False, "color_rgb": [0, 0, 0],
+        "alignment": "left", "spacing_before_pt": 0, "spacing_after_pt": 4}
+
+
+def build_content(paragraphs, sections):
+    per_section = paragraphs // sections
+    return {"sections": {
+        f"section_{s}": [f"Bullet {s}.{i}: delivered a representative achievement with measurable impact." for i in range(per_section)]
+        for s in range(sections)
+    }}
+
+
+def apply(para, style):
+    run = para.runs[0]
+    run.font.name = style["font_name"]
+    run.font.size = Pt(style["font_size_pt"])
+    run.bold = style["bold"]
+    run.font.color.rgb = RGBColor(*style["color_rgb"])
+    para.paragraph_format.alignment = {
+        "left": WD_ALIGN_PARAGRAPH.LEFT,
+        "center": WD_ALIGN_PARAGRAPH.CENTER,
+        "right": WD_ALIGN_PARAGRAPH.RIGHT,
+        "justify": WD_ALIGN_PARAGRAPH.JUSTIFY
+    }.get(style["alignment"], WD_ALIGN_PARAGRAPH.LEFT)
+    para.paragraph_format.space_before = Pt(style["spacing_before_pt"])
+    para.paragraph_format.space_after = Pt(style["spacing_after_pt"])
+
+
+def legacy_build(content):
+    doc = Document()
+    for key, items in content["sections"].items():
+        apply(doc.add_paragraph(key.replace("_", " ").title()), HEADER)
+        for item in items:
+            apply(doc.add_paragraph(item, style="List Bullet"), BODY)
+    stream = BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def compiled_build(content, style_mode="direct"):
+    return create_reformatted_docx(content, style_profile={"header": HEADER, "body": BODY, "sections": []},
+                                   style_mode=style_mode)
+
+
+def named_build(content):
+    return compiled_build(content, style_mode="named")
+
+
+def document_xml_kb(package):
+    with zipfile.ZipFile(BytesIO(package)) as zf:
+        return len(zf.read("word/document.xml")) / 1024
+
+
+def timed(func, content, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paragraphs', type=int, default=5000)
+    parser.add_argument('--sections', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    content = build_content(args.paragraphs, args.sections)
+    legacy_s = timed(legacy_build, content, args.repeat)
+    compiled_s = timed(compiled_build, content, args.repeat)
+    named_s = timed(named_build, content, args.repeat)
+
+    print(f"{'paragraphs':>10} {'setters (s)':>12} {'compiled (s)':>13} {'named (s)':>10} {'speedup':>8}")
+    print(f"{args.paragraphs:10d} {legacy_s:12.3f} {compiled_s:13.3f} {named_s:10.3f} {legacy_s / compiled_s:7.1f}x")
+    print(f"document.xml: direct {document_xml_kb(compiled_build(content)):.0f} KB, "
+          f"named {document_xml_kb(named_build(content)):.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark .docx body extraction: the legacy indexed loop from main.index against ooxml_reader.iter_blocks.
+
+The legacy loop indexes ``doc.paragraphs`` / ``doc.tables`` for every body element, which python-docx
+rebuilds on each access (O(n^2)); it is skipped above --legacy-max paragraphs. Both timings include reading
+the package.
+
+Usage:
+    python benchmarks/bench_docx_walker.py [--sizes 1000 10000 50000] [--legacy-max 10000]
+"""
+import argparse
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from docx import Document
+from app.utils.ooxml_reader import iter_blocks
+
+
+def build_document(paragraphs, table_every=200):
+    doc = Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Paragraph {i} with some representative resume text." if i % 7 else "")
+        if table_every and i % table_every == table_every - 1:
+            table = doc.add_table(rows=3, cols=3)
+            for r in range(3):
+                for c in range(3):
+                    table.cell(r, c).text = f"{i}:{r}:{c}"
+    stream = BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def legacy_extract(data):
+    doc = Document(BytesIO(data))
+    raw_content = []
+    for element in doc.element.body:
+        if element.tag.endswith('p'):
+            para = doc.paragraphs[len(raw_content)]
+            text = para.text.strip()
+            if text:
+                raw_content.append({"type": "paragraph", "text": text})
+        elif element.tag.endswith('tbl'):
+            table = doc.tables[len([e for e in raw_content if e["type"] == "table"])]
+            table_content = [[cell.text.strip() for cell in row.cells] for row in table.rows]
+            raw_content.append({"type": "table", "content": table_content})
+    return raw_content
+
+
+def reader_extract(data):
+    raw_content = []
+    for block in iter_blocks(BytesIO(data)):
+        if block.kind == "table":
+            raw_content.append({"type": "table", "content": block.rows})
+        elif block.text.strip():
+            raw_content.append({"type": "paragraph", "text": block.text.strip()})
+    return raw_content
+
+
+def timed(func, data):
+    started = time.perf_counter()
+    result = func(data)
+    return time.perf_counter() - started, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--legacy-max', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'paragraphs':>10} {'legacy (s)':>12} {'reader (s)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        data = build_document(size)
+        reader_s, _ = timed(reader_extract, data)
+        if size <= args.legacy_max:
+            legacy_s, _ = timed(legacy_extract, data)
+            print(f"{size:10d} {legacy_s:12.3f} {reader_s:12.3f} {legacy_s / reader_s:7.1f}x")
+        else:
+            print(f"{size:10d} {'skipped':>12} {reader_s:12.3f} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark create_reformatted_docx with the python-docx path against the direct OOXML writer.
+
+Two outputs: a bullet list of --paragraphs items, and a --rows x --cols table. Both builds include saving
+the package; the direct writer's document.xml is identical to the python-docx one (see check_writer_parity.py).
+
+Usage:
+    python benchmarks/bench_ooxml_writer.py [--paragraphs 10000] [--rows 5000] [--cols 4] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.docx_builder import create_reformatted_docx
+from app.utils.ir import StructuredDocument, Section, Table, SECTION_LIST, SECTION_TABLES
+
+PROFILE = {
+    "header": {"font_name": "Georgia", "font_size_pt": 14, "bold": True, "color_rgb": [31, 56, 100],
+               "alignment": "left", "spacing_before_pt": 12, "spacing_after_pt": 6},
+    "body": {"font_name": "Calibri", "font_size_pt": 11, "bold": False, "color_rgb": [0, 0, 0],
+             "alignment": "left", "spacing_before_pt": 0, "spacing_after_pt": 4},
+    "sections": [],
+}
+
+
+def paragraph_content(paragraphs):
+    return StructuredDocument([Section("experience", SECTION_LIST, [
+        f"Bullet {i}: delivered a representative achievement with measurable impact." for i in range(paragraphs)
+    ])])
+
+
+def table_content(rows, cols):
+    return StructuredDocument([Section("tables", SECTION_TABLES, [
+        Table([[f"r{r}c{c}" for c in range(cols)] for r in range(rows)])
+    ])])
+
+
+def timed(content, direct_writer, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        create_reformatted_docx(content, style_profile=PROFILE, direct_writer=direct_writer)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paragraphs', type=int, default=10000)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--cols', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cases = [
+        (f"{args.paragraphs} paragraphs", paragraph_content(args.paragraphs)),
+        (f"{args.rows}x{args.cols} table", table_content(args.rows, args.cols)),
+    ]
+    print(f"{'output':>20} {'python-docx (s)':>16} {'direct (s)':>11} {'speedup':>8}")
+    for label, content in cases:
+        docx_s = timed(content, False, args.repeat)
+        direct_s = timed(content, True, args.repeat)
+        print(f"{label:>20} {docx_s:16.3f} {direct_s:11.3f} {docx_s / direct_s:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Check that OoxmlWriter output matches the python-docx path of create_reformatted_docx.
+
+Each case is built twice, with direct_writer=False and direct_writer=True, in both style modes, for fixed
+style profiles and for a generated template with RGB-colored runs (style profile and skeleton computed by
+template_artifacts.compute_artifacts, as when the template is saved).
+word/document.xml and word/styles.xml must be byte-identical, and both packages must have the same parts.
+Merged cells are read back as well: each must hold exactly one paragraph, as the source cell did. Exits
+non-zero if any case fails.
+
+Usage:
+    python benchmarks/check_writer_parity.py
+"""
+import os
+import sys
+import zipfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Pt, RGBColor
+from lxml import etree
+from app.utils.docx_builder import create_reformatted_docx
+from app.utils.template_artifacts import compute_artifacts
+from app.utils.ir import StructuredDocument, Section, Table, SECTION_TEXT, SECTION_LIST, SECTION_TABLES
+
+HEADER = {"font_name": "Georgia", "font_size_pt": 14, "bold": True, "color_rgb": [31, 56, 100],
+          "alignment": "left", "spacing_before_pt": 12, "spacing_after_pt": 6}
+BODY = {"font_name": "Calibri", "font_size_pt": 11, "bold": False, "color_rgb": [0, 0, 0],
+        "alignment": "left", "spacing_before_pt": 0, "spacing_after_pt": 4, "is_horizontal_list": False}
+
+
+def colored_template():
+    doc = Document()
+    for heading, body in (("EXPERIENCE", "Led a team of five."), ("EDUCATION", "BSc, 2019")):
+        run = doc.add_paragraph().add_run(heading)
+        run.bold = True
+        run.font.size = Pt(14)
+        run.font.color.rgb = RGBColor(0x1F, 0x38, 0x64)
+        run = doc.add_paragraph().add_run(body)
+        run.font.color.rgb = RGBColor(0x40, 0x40, 0x40)
+    stream = BytesIO()
+    doc.save(stream)
+    artifacts = compute_artifacts(stream.getvalue(), None)
+    return artifacts["style_profile"], artifacts["skeleton"]
+
+
+# (style profile, skeleton) pairs
+PROFILES = {
+    "template": ({"header": HEADER, "body": BODY, "sections": []}, None),
+    "empty": ({"header": None, "body": None, "sections": []}, None),
+    "colored template": colored_template(),
+}
+SECTION_STYLES = {"experience": {"font_name": "Verdana", "alignment": "right"}, "name": {"color_rgb": [200, 0, 0]}}
+
+TRICKY_TEXT = [
+    "plain", " leading space", "trailing space ", "tab\tseparated", "line one\nline two", "crlf\r\nend",
+    "\tstarts with tab", "ends with newline\n", "a & b < c > d \"quoted\" 'single'", "unicode: café – ✓ 日本語",
+    "", "   ", "\n", "multiple   inner   spaces", 'literal xmlns:w="urn:x" in text',
+]
+
+CASES = {
+    "dict content": {"sections": {
+        "name": "Jane Doe",
+        "contact": ["jane@example.com", "555-0100"],
+        "professional_summary": "Summary with\ttab and\nbreak ",
+        "core_competencies": ["Leadership", "Planning"],
+        "experience": TRICKY_TEXT,
+        "tables": [[["Year", "Role"], ["2020", "Lead & Manager"], ["2021", ""]]],
+    }},
+    "structured content": StructuredDocument([
+        Section("name", SECTION_TEXT, "N. Body"),
+        Section("skills", SECTION_LIST, ["x", "y", "z"]),
+        Section("tables", SECTION_TABLES, [
+            Table([["a", "b", "c"], ["d", "e"], []]),
+            Table([["only"]]),
+            Table([]),
+            Table([["m", "", "c"], ["d", "e", "f"], ["", "h", "i"]], [[0, 0, 1, 2], [1, 0, 2, 1]]),
+        ]),
+        Section("summary", SECTION_TEXT, "closing paragraph"),
+    ]),
+    "empty sections": {"sections": {"summary": "", "skills": [], "education": ["   "]}},
+}
+
+
+def parts(package):
+    with zipfile.ZipFile(BytesIO(package)) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def merged_cell_problems(document_xml):
+    # A merge origin carries w:gridSpan or w:vMerge="restart"; covered cells' empty paragraphs must not
+    # have been moved into it
+    problems = []
+    for tc in etree.fromstring(document_xml).iter(qn("w:tc")):
+        grid_span = tc.find(f"{qn('w:tcPr')}/{qn('w:gridSpan')}")
+        v_merge = tc.find(f"{qn('w:tcPr')}/{qn('w:vMerge')}")
+        if grid_span is None and (v_merge is None or v_merge.get(qn("w:val")) != "restart"):
+            continue
+        paragraphs = tc.findall(qn("w:p"))
+        if len(paragraphs) != 1:
+            text = "".join(tc.itertext())
+            problems.append(f"merged cell {text!r} has {len(paragraphs)} paragraphs")
+    return problems
+
+
+def main():
+    failures = 0
+    checked = 0
+    for case_name, content in CASES.items():
+        for profile_name, (profile, skeleton) in PROFILES.items():
+            for style_mode in ("direct", "named"):
+                outputs = [
+                    parts(create_reformatted_docx(content, style_profile=profile, skeleton=skeleton, section_styles=SECTION_STYLES,
+                                                  style_mode=style_mode, direct_writer=direct_writer))
+                    for direct_writer in (False, True)
+                ]
+                label = f"{case_name} / {profile_name} profile / {style_mode} styles"
+                checked += 1
+                problems = []
+                if set(outputs[0]) != set(outputs[1]):
+                    problems.append(f"parts differ: {sorted(set(outputs[0]) ^ set(outputs[1]))}")
+                for part in ("word/document.xml", "word/styles.xml"):
+                    if outputs[0].get(part) != outputs[1].get(part):
+                        problems.append(f"{part} differs")
+                for output in outputs:
+                    problems.extend(merged_cell_problems(output["word/document.xml"]))
+                if problems:
+                    failures += 1
+                    print(f"FAIL {label}: {'; '.join(problems)}")
+                else:
+                    print(f"ok   {label}")
+    print(f"{checked - failures}/{checked} cases identical")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Report LLM input-token savings of the compact serializer over a corpus of .docx files.
+
+Template prompts saved as .txt files in the same paths are reported per template, comparing
+the full prompt with the style-free prompt produced by compact_template_prompt.
+
+Usage:
+    python benchmarks/token_savings.py path/to/corpus [more paths ...] [--strip-boilerplate]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from docx import Document
+from app.utils.document import process_docx
+from app.utils.serialization import estimate_tokens
+from app.utils.prompt_compaction import compact_template_prompt, compaction_savings
+
+
+def legacy_serialize(path):
+    """The pre-compaction process_docx output (Python list reprs, blank-line separated)."""
+    doc = Document(path)
+    content = []
+    for table in doc.tables:
+        table_content = [[cell.text.strip() for cell in row.cells] for row in table.rows]
+        content.append(f"Table: {table_content}")
+    for para in doc.paragraphs:
+        text = para.text.strip()
+        if text:
+            content.append(text)
+    return "\n\n".join(content)
+
+
+def iter_files(paths, extension):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(extension) and not name.startswith('~$'):
+                        yield os.path.join(root, name)
+        elif path.endswith(extension):
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--strip-boilerplate', action='store_true')
+    args = parser.parse_args()
+
+    total_before = total_after = 0
+    documents = list(iter_files(args.paths, '.docx'))
+    if documents:
+        print(f"{'file':50} {'before':>8} {'after':>8} {'saved':>7}")
+    for path in documents:
+        before = estimate_tokens(legacy_serialize(path))
+        with open(path, 'rb') as f:
+            after = estimate_tokens(process_docx(f, strip_boilerplate=args.strip_boilerplate))
+        total_before += before
+        total_after += after
+        saved = 100.0 * (before - after) / before if before else 0.0
+        print(f"{os.path.basename(path)[:50]:50} {before:8d} {after:8d} {saved:6.1f}%")
+
+    if total_before:
+        saved = 100.0 * (total_before - total_after) / total_before
+        print(f"{'TOTAL':50} {total_before:8d} {total_after:8d} {saved:6.1f}%")
+
+    prompts = list(iter_files(args.paths, '.txt'))
+    if not documents and not prompts:
+        print("No .docx or .txt files found")
+    if prompts:
+        print(f"\n{'template prompt':50} {'before':>8} {'after':>8} {'saved':>7}")
+    for path in prompts:
+        with open(path, encoding='utf-8') as f:
+            template_prompt = f.read()
+        compact_prompt, _ = compact_template_prompt(template_prompt)
+        savings = compaction_savings(template_prompt, compact_prompt)
+        print(f"{os.path.basename(path)[:50]:50} {savings['tokens_before']:8d} "
+              f"{savings['tokens_after']:8d} {savings['percent_saved']:6.1f}%")
+
+
+if __name__ == '__main__':
+    main()